@@ -0,0 +1,301 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from functools import partial
+
+from PIL import Image
+
+import lgscore
+
+# Headless benchmarks for the LGS load/match pipeline, page generation, image
+# preparation and hit-testing, run against synthetic RetroPie libraries.
+# Only the lgscore library layer runs, no Tk window is opened, so PhotoImage
+# conversion and canvas drawing are not measured. Results are JSON for
+# comparing releases:
+#
+#   python3 bench.py --games 10,1000,100000 --output bench_output.txt
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SYSTEMS = ["psx", "mame-libretro", "nes", "snes"]
+
+def log(message):
+    print(message, file=sys.stderr)
+
+def median_ms(fn, repeat, setup=None):
+    # Median wall time of fn() in milliseconds, setup() runs untimed before each
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 3), result
+
+def make_media(media_dir, count):
+    # Shared game art: every third image is a large RGBA screenshot, the rest
+    # small RGB box art, like a typical scrape
+    os.makedirs(media_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(media_dir, f"art_{i}.png")
+        if not os.path.exists(path):
+            if i % 3 == 0:
+                Image.new("RGBA", (1920, 1080), (i % 255, 40, 90, 200)).save(path)
+            else:
+                Image.new("RGB", (640, 480), (90, i % 255, 40)).save(path)
+        paths.append(path)
+    return paths
+
+def make_library(work_dir, games, media, media_games):
+    # gamelist.xml trees spread over SYSTEMS plus a matching inscoperoms.xml.
+    # 90% of games are lightgun ROMs, some listed under another region tag
+    # (only found by the normalized match) and some not in the gamelist.
+    # Games past media_games point at art that was never scraped.
+    inscope = ET.Element("inscoperoms")
+    per_system = max(1, games // len(SYSTEMS))
+
+    for system in SYSTEMS:
+        rompath = os.path.join(work_dir, "roms", system)
+        os.makedirs(rompath, exist_ok=True)
+        gamelist = ET.Element("gameList")
+        entry = ET.SubElement(inscope, "system", name=system)
+        ET.SubElement(entry, "gamelist").text = os.path.join(rompath, "gamelist.xml")
+        roms = ET.SubElement(entry, "lightgunroms")
+
+        for i in range(per_system):
+            title = f"{system} Shooter {i}"
+            game = ET.SubElement(gamelist, "game")
+            ET.SubElement(game, "path").text = f"./{title} (USA).zip"
+            ET.SubElement(game, "name").text = title
+            ET.SubElement(game, "desc").text = "Aim for the screen and pull the trigger. " * 8
+            if i % 5:
+                if i < media_games and i % 7:
+                    image = media[i % len(media)]
+                else:
+                    image = f"./images/{system}_{i}-image.png"
+                ET.SubElement(game, "image").text = image
+
+            if i % 10 == 9:
+                continue
+            region = "Europe" if i % 20 == 3 else "USA"
+            ET.SubElement(roms, "rom", name=title, file=f"{title} ({region}).zip")
+            if i % 50 == 0:
+                ET.SubElement(roms, "rom", name=f"{title} Missing", file=f"{title} Missing (USA).zip")
+
+        ET.ElementTree(gamelist).write(os.path.join(rompath, "gamelist.xml"), encoding="utf-8")
+
+    inscope_path = os.path.join(work_dir, "inscoperoms.xml")
+    ET.ElementTree(inscope).write(inscope_path, encoding="utf-8")
+    return inscope_path
+
+def bench_library(settings, inscope_path, cache_path, repeat):
+    def load():
+        return lgscore.load_library(inscope_path, cache_path, settings.loader_workers,
+                                    settings.loader_pool, settings.normalized_rom_match)
+
+    def drop_cache():
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(cache_path)
+
+    def touch_one():
+        gamelist = os.path.join(os.path.dirname(inscope_path), "roms", SYSTEMS[0], "gamelist.xml")
+        st = os.stat(gamelist)
+        os.utime(gamelist, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+    cold, library = median_ms(load, repeat, drop_cache)
+    warm, _ = median_ms(load, repeat)
+    one_changed, _ = median_ms(load, repeat, touch_one)
+    return library, {
+        "library_cold_ms": cold,
+        "library_warm_ms": warm,
+        "library_one_changed_ms": one_changed,
+    }
+
+def system_pages(settings, layout, library, media=None, max_pages=64):
+    return lgscore.LazyScreens(
+        {},
+        {system: len(data.lightgunroms) for system, data in library.items()},
+        layout.games_per_page,
+        partial(lgscore.build_page, library, layout, settings.theme_path, media=media),
+        max_pages
+    )
+
+def bench_pages(settings, layout, library, repeat):
+    def build_all():
+        screens = system_pages(settings, layout, library)
+        for name in screens:
+            screens[name]
+        return len(screens)
+
+    elapsed, pages = median_ms(build_all, repeat)
+    return pages, {
+        "pages_build_all_ms": elapsed,
+        "pages_build_us_per_page": round(elapsed * 1000 / max(1, pages), 3),
+    }
+
+def bench_memory(settings, layout, inscope_path, cache_path):
+    # Bytes held by the matched library (read from its cache) and by every
+    # system page built at once, as traced by tracemalloc
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        library = lgscore.load_library(inscope_path, cache_path, settings.loader_workers,
+                                       settings.loader_pool, settings.normalized_rom_match)
+        library_bytes = tracemalloc.get_traced_memory()[0] - before
+
+        before = tracemalloc.get_traced_memory()[0]
+        screens = system_pages(settings, layout, library, max_pages=sys.maxsize)
+        pages = [screens[name] for name in screens]
+        pages_bytes = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    matched = sum(len(data.lightgunroms) for data in library.values())
+    zones = sum(len(page["zones"]) for page in pages)
+    return {
+        "library_kb": round(library_bytes / 1024, 1),
+        "library_bytes_per_rom": round(library_bytes / max(1, matched), 1),
+        "pages_kb": round(pages_bytes / 1024, 1),
+        "pages_bytes_per_zone": round(pages_bytes / max(1, zones), 1),
+    }
+
+def bench_images(images, names, thumb_dir, repeat):
+    def prepare():
+        for name in names:
+            for load in images.screen_images(name).values():
+                load()
+
+    def clear_thumbs():
+        shutil.rmtree(thumb_dir, ignore_errors=True)
+        # Theme images, game art and baked pages share one cache here.
+        # Cold runs list the media folders again.
+        images.media.clear()
+        images.thumbs = images.assets = images.pages = lgscore.ThumbnailCache(thumb_dir, 1024, images.media)
+
+    metrics = {}
+    for mode, baked in (("layers", False), ("baked", True)):
+        images.baked = baked
+        cold, _ = median_ms(prepare, repeat, clear_thumbs)
+        warm, _ = median_ms(prepare, repeat)
+        metrics[f"images_{mode}_cold_ms_per_page"] = round(cold / len(names), 3)
+        metrics[f"images_{mode}_warm_ms_per_page"] = round(warm / len(names), 3)
+    return metrics
+
+def bench_hits(zones, screen_size, lookups, repeat):
+    width, height = screen_size
+    rng = random.Random(1)
+    points = [(rng.randrange(width), rng.randrange(height)) for _ in range(lookups)]
+
+    def lookup_all():
+        index = lgscore.HitIndex(zones, width, height)
+        return sum(1 for x, y in points if index.zone_at(x, y) is not None)
+
+    build, _ = median_ms(lambda: lgscore.HitIndex(zones, width, height), repeat)
+    elapsed, hits = median_ms(lookup_all, repeat)
+    return {
+        "hit_index_build_ms": build,
+        "hit_lookup_ns": round((elapsed - build) * 1e6 / lookups, 1),
+        "hit_ratio": round(hits / lookups, 3),
+    }
+
+def run(settings, layout, games, work_dir, media, args):
+    log(f"--- {games} games")
+    run_dir = os.path.join(work_dir, f"games_{games}")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    started = time.perf_counter()
+    inscope_path = make_library(run_dir, games, media, args.pages * layout.games_per_page)
+    metrics = {"generate_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    library, library_metrics = bench_library(settings, inscope_path, os.path.join(run_dir, "library.pickle"), args.repeat)
+    metrics.update(library_metrics)
+
+    pages, page_metrics = bench_pages(settings, layout, library, args.repeat)
+    metrics.update(page_metrics)
+    metrics.update(bench_memory(settings, layout, inscope_path, os.path.join(run_dir, "library.pickle")))
+
+    media = lgscore.MediaIndex()
+    screens = system_pages(settings, layout, library, media)
+    names = [name for name in screens if int(name.rpartition("_")[2]) <= args.pages]
+    if names:
+        thumb_dir = os.path.join(run_dir, "thumbs")
+        images = lgscore.PageImages(screens, lgscore.ThumbnailCache(thumb_dir, 1024, media), layout,
+                                    settings.theme_path, media=media)
+        metrics.update(bench_images(images, names, thumb_dir, args.repeat))
+        metrics.update(bench_hits(screens[names[0]]["zones"], layout.screen_size, args.lookups, args.repeat))
+
+    if not args.keep:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {
+        "games": games,
+        "systems": len(SYSTEMS),
+        "matched": sum(len(data.lightgunroms) for data in library.values()),
+        "pages": pages,
+        "metrics": metrics,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless LGS benchmarks on synthetic libraries")
+    parser.add_argument("--games", default="10,1000,10000,100000", help="comma separated library sizes")
+    parser.add_argument("--pages", type=int, default=2, help="pages per system to prepare images for")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the median is reported")
+    parser.add_argument("--resolution", type=lgscore.parse_resolution, default=lgscore.DESIGN_SIZE,
+                        metavar="WxH", help="screen size the theme is scaled to")
+    parser.add_argument("--lookups", type=int, default=100000, help="pointer lookups for the hit test")
+    parser.add_argument("--work-dir", help="where to generate libraries (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep generated libraries")
+    parser.add_argument("--output", default="-", help="JSON results file, - for stdout")
+    args = parser.parse_args()
+
+    # The loaders report progress on stdout, which is kept for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        settings = lgscore.load_settings(os.path.join(BENCH_DIR, "settings.xml"))
+        layout = lgscore.load_theme_layout(f"{settings.theme_path}gamescreen.xml").scaled(args.resolution)
+
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix="lgs-bench-")
+        try:
+            media = make_media(os.path.join(work_dir, "media"), 2 * args.pages * layout.games_per_page)
+            runs = [run(settings, layout, int(games), work_dir, media, args) for games in args.games.split(",")]
+        finally:
+            if not args.work_dir and not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "loader_workers": settings.loader_workers,
+            "loader_pool": settings.loader_pool,
+            "normalized_rom_match": settings.normalized_rom_match,
+            "games_per_page": layout.games_per_page,
+            "resolution": list(layout.screen_size),
+            "repeat": args.repeat,
+        },
+        "runs": runs,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        log(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
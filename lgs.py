@@ -1,429 +1,471 @@
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from pygame import mixer
 import threading
+import queue
 import time
-import xml.etree.ElementTree as ET
-import sys
 import os
+import sys
 import re
+import subprocess
+import atexit
+import argparse
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from lgscore import (
+    DESIGN_SIZE, LAUNCH, NAVIGATE, PROFILER, LgsError, FileWatcher, HitIndex, LazyScreens, MediaIndex, PageImages,
+    ThumbnailCache, asset_cache, build_index, build_page, check_base_files, check_theme,
+    file_stamp, framebuffer_resolution, library_changes, load_library, load_main_screen, load_settings,
+    load_theme_layout, page_cache, parse_resolution,
+)
+from lgsinput import MOVE, DeviceReader, ReplayReader, crosshair_path, open_guns, record_input
+
+# Startup stages are profiled from here, once the modules are imported
+STARTED = time.perf_counter()
+
+class PhotoCache:
+    # Bounded LRU of ready-to-blit PhotoImages, evicted by estimated pixel
+    # bytes (Tk keeps 4 bytes per pixel). Images on the current screen stay
+    # referenced by the canvas owner, so eviction never blanks them. Each
+    # photo keeps the (path, stamp) of the files it was made from.
+    def __init__(self, max_mb):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.items = OrderedDict()
+        self.total_bytes = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, photo, sources=()):
+        if key in self.items:
+            self.total_bytes -= self.items.pop(key)[1]
+
+        nbytes = photo.width() * photo.height() * 4
+        self.items[key] = (photo, nbytes, sources)
+        self.total_bytes += nbytes
+
+        while self.total_bytes > self.max_bytes and len(self.items) > 1:
+            _, (_, evicted_bytes, _) = self.items.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+
+    def sources(self, key):
+        return self.items[key][2]
+
+    def source_paths(self):
+        return set(path for _, _, sources in self.items.values() for path, _ in sources)
+
+    def discard(self, match):
+        for key in [key for key in self.items if match(key)]:
+            self.total_bytes -= self.items.pop(key)[1]
+
+    def clear(self):
+        self.items.clear()
+        self.total_bytes = 0
+
+class Prefetcher:
+    # Decodes and resizes the images of likely next screens on worker threads.
+    # PhotoImages can only be made on the Tk thread, so finished PIL images
+    # are queued and turned into cached photos from an after() tick. Every
+    # schedule() starts a new generation and drops work queued before it.
+    # A tick converts at most tick_bytes of pixels (at least one image), so
+    # a full-screen background or baked page gets a tick of its own and the
+    # crosshair keeps moving in between.
+    POLL_MS = 30
+
+    def __init__(self, root, photos, screen_images, source_stamps, workers, tick_bytes):
+        self.root = root
+        self.photos = photos
+        self.screen_images = screen_images
+        self.source_stamps = source_stamps
+        self.tick_bytes = tick_bytes
+        self.jobs = queue.Queue()
+        self.ready = queue.Queue()
+        # An image taken from ready that did not fit into the last tick
+        self.held = None
+        self.generation = 0
+        self.generation_bytes = 0
+
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+        self.root.after(self.POLL_MS, self._drain)
+
+    def schedule(self, screen_names):
+        self.cancel()
+        for name in screen_names:
+            self.jobs.put((self.generation, name))
+
+    def cancel(self):
+        self.generation += 1
+        self.generation_bytes = 0
+
+    def _worker(self):
+        while True:
+            generation, name = self.jobs.get()
+            for key, loader in self.screen_images(name).items():
+                if generation != self.generation:
+                    break
+                if key in self.photos:
+                    continue
+                try:
+                    image = loader()
+                    sources = self.source_stamps(loader)
+                except Exception as e:
+                    print(f"[WARN] Prefetch failed for {key}: {e}")
+                    continue
+                self.ready.put((generation, key, image, sources))
+
+    def _drain(self):
+        spent = 0
+        while True:
+            if self.held is None:
+                try:
+                    self.held = self.ready.get_nowait()
+                except queue.Empty:
+                    break
+            generation, key, image, sources = self.held
+            if generation != self.generation or key in self.photos:
+                self.held = None
+                continue
+
+            image_bytes = image.width * image.height * 4
+            if spent and spent + image_bytes > self.tick_bytes:
+                break
+            self.held = None
+            spent += image_bytes
+
+            # Prefetch may take at most half the cache, the rest stays with
+            # pages the user has actually visited
+            self.generation_bytes += image_bytes
+            if self.generation_bytes > self.photos.max_bytes // 2:
+                self.cancel()
+                continue
+            self.photos.put(key, ImageTk.PhotoImage(image), sources)
+
+        self.root.after(self.POLL_MS, self._drain)
+
+class SoundEngine:
+    # Theme sounds are decoded once into mixer.Sound buffers and played on a
+    # few reserved channels, so quick follow-up shots mix instead of cutting
+    # each other off. Completion callbacks are scheduled on the Tk loop from
+    # the sound length, nothing polls the mixer.
+    def __init__(self, root, paths, channels):
+        self.root = root
+        if mixer.get_num_channels() < channels:
+            mixer.set_num_channels(channels)
+        mixer.set_reserved(channels)
+        self.channels = [mixer.Channel(i) for i in range(channels)]
+        # When each channel last started a sound
+        self.started = [0.0] * channels
+
+        self.sounds = {}
+        for name, path in paths.items():
+            try:
+                self.sounds[name] = mixer.Sound(path)
+            except Exception as e:
+                print(f"[WARN] Failed to load sound '{path}': {e}")
+
+    def play(self, name, on_done=None):
+        # Returns the playback length in ms
+        sound = self.sounds.get(name)
+        if sound is None:
+            if on_done:
+                self.root.after(0, on_done)
+            return 0
+
+        idx = self.free_channel()
+        self.channels[idx].play(sound)
+        self.started[idx] = time.monotonic()
+        length_ms = int(sound.get_length() * 1000)
+        if on_done:
+            self.root.after(length_ms, on_done)
+        return length_ms
+
+    def free_channel(self):
+        for idx, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return idx
+
+        # All busy: cut off the oldest shot
+        return min(range(len(self.channels)), key=self.started.__getitem__)
+
+class ActionQueue:
+    # Zone actions run one at a time on the Tk loop. A shot landing while an
+    # action is pending, or within the debounce window after one finished,
+    # is dropped. Blocking work goes to a single worker thread; an action
+    # returning its Future keeps the queue busy until that work is done.
+    POLL_MS = 50
+
+    def __init__(self, root, debounce_ms):
+        self.root = root
+        self.debounce_ms = debounce_ms
+        self.pending = False
+        self.last_done = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
 
-# Base files and folders
-file0 = "lgs.py"
-file1 = "inscoperoms.xml"
-file2 = "settings.xml"
-folder = "themes"
-
-# Check if base files and folder exist
-if not (os.path.isfile(file0) and os.path.isfile(file1) and os.path.isfile(file2) and os.path.isdir(folder)):
-    print("Error: One or more required files or folders are missing.")
-    sys.exit(1)
-
-print("All required base files and folder exist.")
-
-try:
-    tree = ET.parse("settings.xml")
-    root = tree.getroot()
-    selected_theme_elem = root.find("selected_theme")
-
-    if selected_theme_elem is None or not selected_theme_elem.text.strip():
-        print("Error: <selected_theme> is missing or empty in settings.xml.")
-        sys.exit(1)
+    def busy(self):
+        return self.pending or time.monotonic() * 1000 - self.last_done < self.debounce_ms
 
-    SELECTED_THEME = selected_theme_elem.text.strip()
-
-except ET.ParseError as e:
-    print(f"Error parsing settings.xml: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"Unexpected error reading settings.xml: {e}")
-    sys.exit(1)
-    
-# Theme path
-theme_path = os.path.join("themes", SELECTED_THEME)
-
-if not os.path.isdir(theme_path):
-    print("Error: selected theme folder missing.")
-    sys.exit(1)
-
-print("Selected theme found.")
-
-# Required theme files
-required_files = [
-    "tag_3do.png", "gamescreen.xml", "3do.png", "tag_nes.png", "dent_systems.png",
-    "tag_segacd.png", "button_next.png", "game_default.png", "tag_atari2600.png", "main.xml",
-    "tag_zxspectrum.png", "button_prev.png", "hit.mp3", "tag_sega32x.png", "tag_dreamcast.png",
-    "tag_saturn.png", "tag_mastersystem.png", "tag_mame.png", "atari2600.png", "target.png",
-    "tag_atari7800.png", "tag_megadrive.png", "tag_psx.png", "button_main.png", "dent_main.png",
-    "Logo.png", "Logo_mini.png", "game.png", "main.png", "tag_snes.png", "miss.mp3",
-    "atari7800.png", "dreamcast.png", "mame-libretro.png", "mastersystem.png",
-    "megadrive.png", "nes.png", "psx.png", "saturn.png",
-    "sega32x.png", "segacd.png", "snes.png", "zxspectrum.png",
-]
-
-# Check for missing theme files
-missing_files = [f for f in required_files if not os.path.isfile(os.path.join(theme_path, f))]
-
-if missing_files:
-    print("Error: The following required files are missing in the theme folder:")
-    for file in missing_files:
-        print(f" - {file}")
-    sys.exit(1)
-
-print("All required theme files are present.")
-
-# Store theme path as variable
-THEME_PATH = theme_path + os.sep  # Adds trailing slash
-
-XML_PATH = f"{THEME_PATH}gamescreen.xml"
-
-if not os.path.exists(XML_PATH):
-    print(f"Error: XML file '{XML_PATH}' not found.")
-    sys.exit(1)
-
-try:
-    tree = ET.parse(XML_PATH)
-    root = tree.getroot()
-
-    layout = root.find("layout")
-    game_name = layout.find("game_name")
-
-    GAME_NAME_X = int(game_name.get("x"))
-    GAME_NAME_Y = int(game_name.get("y"))
-    GAME_NAME_FONT = eval(game_name.get("font"))  # e.g. "('Arial', 18, 'bold')"
-    GAME_NAME_FILL = game_name.get("colour")
-    GAME_NAME_WIDTH = int(game_name.get("width"))
-
-except Exception as e:
-    print(f"Error loading game_name from XML: {e}")
-    sys.exit(1)
-
-print("Loaded game_name settings successfully.")
-
-def load_main_screen(xml_path, show_screen_func):
-    if not os.path.exists(xml_path):
-        print(f"Error: {xml_path} not found.")
-        sys.exit(1)
+    def submit(self, action, delay_ms=0):
+        if self.busy():
+            return False
+        self.pending = True
+        self.root.after(delay_ms, self._run, action)
+        return True
 
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
+    def background(self, func, *args):
+        return self.executor.submit(func, *args)
 
-        if root.tag != "screen" or root.attrib.get("name") != "main":
-            print("Error: Invalid root element or screen name.")
-            sys.exit(1)
+    def _run(self, action):
+        try:
+            result = action()
+        except Exception as e:
+            print(f"[ERROR] Action failed: {e}")
+            result = None
 
-        bg_attr = root.attrib.get("bg")
-        if not bg_attr:
-            bg = os.path.join(THEME_PATH, "main.png")
+        if isinstance(result, Future):
+            self._wait(result)
         else:
-            # If the bg path is relative, prepend THEME_PATH
-            bg = os.path.join(THEME_PATH, bg_attr) if not os.path.isabs(bg_attr) else bg_attr
+            self._finish()
 
-        screen_data = {
-            "bg": bg,
-            "zones": []
-        }
+    def _wait(self, future):
+        if not future.done():
+            self.root.after(self.POLL_MS, self._wait, future)
+            return
+        if future.exception():
+            print(f"[ERROR] Action failed: {future.exception()}")
+        self._finish()
 
-        for zone in root.findall("zone"):
-            try:
-                name = zone.attrib["name"]
-                image = zone.attrib["image"]
-                x1 = int(zone.attrib["x1"])
-                y1 = int(zone.attrib["y1"])
-                x2 = int(zone.attrib["x2"])
-                y2 = int(zone.attrib["y2"])
-                target = zone.attrib["target"]
-
-                zone_data = {
-                    "name": name,
-                    "image": f"{THEME_PATH}{image}",
-                    "xy": (x1, y1, x2, y2),
-                    "action": lambda target=target: show_screen_func(target)
-                }
-
-                screen_data["zones"].append(zone_data)
-
-            except KeyError as e:
-                print(f"Error: Missing attribute in zone: {e}")
-                sys.exit(1)
-            except ValueError as e:
-                print(f"Error: Invalid coordinate in zone: {e}")
-                sys.exit(1)
-
-        return screen_data
-
-    except ET.ParseError as e:
-        print(f"Error parsing XML: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        sys.exit(1)
-        
-def parse_inscoperoms_xml(xml_path):
-    if not os.path.exists(xml_path):
-        print(f"ERROR: XML file not found: {xml_path}")
-        sys.exit(1)
+    def _finish(self):
+        self.pending = False
+        self.quiet()
 
-    try:
-        tree = ET.parse(xml_path)
-    except ET.ParseError as e:
-        print(f"ERROR: Failed to parse XML file: {e}")
-        sys.exit(1)
+    def quiet(self):
+        # Start a fresh debounce window, e.g. for stray shots after a game
+        self.last_done = time.monotonic() * 1000
 
-    root = tree.getroot()
-    inscoperoms = {}
+class GameLauncher:
+    # Starts the emulator without blocking Tk: the spawn runs through the
+    # given background runner and the child is then watched from an after()
+    # poll. on_start/on_exit let the menu suspend itself while a game runs.
+    POLL_MS = 250
 
-    for system in root.findall("system"):
-        try:
-            name = system.attrib["name"]
-            gamelist = system.find("gamelist").text
-            #rompath = system.find("rompath").text
-            lightgunroms = []
-
-            for rom in system.find("lightgunroms").findall("rom"):
-                rom_name = rom.attrib["name"]
-                rom_file = rom.attrib["file"]
-                lightgunroms.append({"name": rom_name, "rom": rom_file})
-
-            inscoperoms[name] = {
-                "gamelist": gamelist,
-                #"rompath": rompath,
-                "lightgunroms": lightgunroms
-            }
+    def __init__(self, root, command, run_background, on_start, on_exit):
+        self.root = root
+        self.command = command
+        self.run_background = run_background
+        self.on_start = on_start
+        self.on_exit = on_exit
+        self.future = None
+
+    def running(self):
+        return self.future is not None
+
+    def launch(self, system, rom):
+        if self.future is not None:
+            print(f"[WARN] A game is already running, ignoring {rom}")
+            return None
+
+        args = [part.replace("{system}", system).replace("{rom}", rom) for part in self.command]
+        self.on_start()
+        self.future = self.run_background(subprocess.Popen, args)
+        self.root.after(self.POLL_MS, self._poll)
+        return self.future
+
+    def _poll(self):
+        if not self.future.done():
+            self.root.after(self.POLL_MS, self._poll)
+            return
 
-        except Exception as e:
-            print(f"ERROR: Malformed entry in XML for system '{name}': {e}")
-            sys.exit(1)
+        if self.future.exception():
+            print(f"[ERROR] Failed to launch game: {self.future.exception()}")
+            returncode = None
+        else:
+            process = self.future.result()
+            returncode = process.poll()
+            if returncode is None:
+                self.root.after(self.POLL_MS, self._poll)
+                return
+
+        self.future = None
+        self.on_exit(returncode)
+
+class DentPool:
+    # Fixed ring of dent canvas items. Once the pool is full the oldest dent
+    # is moved to the new shot, so canvas cost stays constant however long
+    # people keep shooting. With an expiry, dents hide themselves.
+    def __init__(self, root, canvas, size, expire_ms=0):
+        self.root = root
+        self.canvas = canvas
+        self.size = size
+        self.expire_ms = expire_ms
+        self.items = []
+        self.next = 0
+        self.timers = {}
+
+    def place(self, x, y, image):
+        if len(self.items) < self.size:
+            item = self.canvas.create_image(x, y, image=image)
+            self.items.append(item)
+        else:
+            item = self.items[self.next]
+            self.canvas.coords(item, x, y)
+            self.canvas.itemconfig(item, image=image, state="normal")
+            self.canvas.tag_raise(item)
+        self.next = (self.next + 1) % self.size
+
+        if self.expire_ms:
+            if item in self.timers:
+                self.root.after_cancel(self.timers[item])
+            self.timers[item] = self.root.after(self.expire_ms, self._expire, item)
+
+    def _expire(self, item):
+        self.timers.pop(item, None)
+        self.canvas.itemconfig(item, state="hidden")
+
+    def clear(self):
+        for timer in self.timers.values():
+            self.root.after_cancel(timer)
+        self.timers = {}
+        for item in self.items:
+            self.canvas.itemconfig(item, state="hidden")
+
+class CanvasSlots:
+    # Retained canvas image items keyed by slot. Showing a screen moves,
+    # re-images or hides existing items and skips unchanged ones; an item is
+    # only created the first time its slot is used.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.items = {}
+        # slot -> [xy, photo], photo is None while hidden
+        self.state = {}
+
+    def show(self, slots):
+        used = set()
+        for slot, xy, photo in slots:
+            used.add(slot)
+            item = self.items.get(slot)
+            if item is None:
+                self.items[slot] = self.canvas.create_image(xy[0], xy[1], anchor='nw', image=photo)
+                self.state[slot] = [xy, photo]
+                continue
+
+            old_xy, old_photo = self.state[slot]
+            if old_xy != xy:
+                self.canvas.coords(item, xy[0], xy[1])
+            if old_photo is None:
+                self.canvas.itemconfig(item, image=photo, state="normal")
+            elif old_photo is not photo:
+                self.canvas.itemconfig(item, image=photo)
+            self.state[slot] = [xy, photo]
+
+        for slot, item in self.items.items():
+            if slot not in used and self.state[slot][1] is not None:
+                # Let go of the photo so the cache budget holds
+                self.canvas.itemconfig(item, image="", state="hidden")
+                self.state[slot][1] = None
 
-    return inscoperoms
 class GunMenu:
-    def __init__(self, root):
+    # Gun events are picked up from the reader queue this often
+    GUN_POLL_MS = 4
+    # Library file changes are checked this often
+    WATCH_POLL_MS = 500
+
+    def __init__(self, root, settings, layout, library):
         self.root = root
+        self.settings = settings
+        self.theme_path = theme_path = settings.theme_path
         self.root.title("Gun Menu")
-        self.root.geometry("1920x1080")
+        # The layout is already scaled to the screen
+        self.layout = layout
+        width, height = layout.screen_size
+        self.root.geometry(f"{width}x{height}")
         self.root.attributes('-fullscreen', True)
         self.root.bind('<Escape>', lambda e: self.root.destroy())
 
         mixer.init()
+        self.sounds = SoundEngine(self.root, {
+            "hit": f"{theme_path}hit.mp3",
+            "miss": f"{theme_path}miss.mp3",
+        }, settings.sound_channels)
+        self.actions = ActionQueue(self.root, settings.action_debounce_ms)
+        self.launcher = GameLauncher(self.root, settings.launch_command, self.actions.background, self.suspend, self.resume)
 
         # Canvas setup
-        self.canvas = tk.Canvas(self.root, width=1920, height=1080, highlightthickness=0)
+        self.canvas = tk.Canvas(self.root, width=width, height=height, highlightthickness=0)
         self.canvas.pack()
 
         self.coord_text = self.canvas.create_text(10, 10, anchor='nw', text="", fill="white", font=("Courier", 12))
-        self.canvas.bind('<Motion>', self.track_mouse)
-        self.canvas.bind('<Button-1>', self.handle_click)
 
         self.current_screen = ""
+        # Pointer motion is coalesced and drawn once per frame, per gun
+        self.frame_ms = 1000 / settings.target_fps
+        self.pointers = {}
+        self.motion_tick = None
+        self.last_motion_frame = 0
+        self.hover_zone = None
         self.bg_image = None
         self.image_id = None
-        self.dentmain_image = ImageTk.PhotoImage(Image.open(f"{THEME_PATH}dent_main.png"))
-        self.dentsub_image = ImageTk.PhotoImage(Image.open(f"{THEME_PATH}dent_systems.png"))
-        self.dents = []
 
-        try:
-            target_img = Image.open(f"{THEME_PATH}target.png")
-            self.target_image = ImageTk.PhotoImage(target_img)
-            self.target_id = self.canvas.create_image(0, 0, anchor='nw', image=self.target_image)
-        except Exception as e:
-            print(f"Error loading target image: {e}")
-            self.target_id = None
-
-        systems = parse_inscoperoms_xml("inscoperoms.xml")
-        # Result container
-        filtered_systems = {}
-
-        for system, data in systems.items():
-            gamelist_path = data.get("gamelist")
-            rompath = os.path.dirname(gamelist_path)
-            lightgunroms = data.get("lightgunroms", [])
-            rom_lookup = {}
-            matched_roms = []
-
-            # Load and parse gamelist.xml
-            if os.path.exists(gamelist_path):
-                try:
-                    tree = ET.parse(gamelist_path)
-                    root = tree.getroot()
-
-                    for game in root.findall("game"):
-                        path = game.findtext("path", "").strip()
-                        name = game.findtext("name", "").strip()
-                        image = game.findtext("image", "").strip()
-
-                        if path:
-                            if path.startswith("./"):
-                                rom_file = os.path.join(rompath, os.path.basename(path))
-                            else:
-                                rom_file = path                            
-                            image_path = image.lstrip("./")  # remove ./ if present
-                            full_image = (
-                                image_path if os.path.isabs(image_path)
-                                else os.path.join(rompath, image_path)
-                            )
-                            rom_lookup[rom_file] = {
-                                "name": name,
-                                "image": full_image
-                            }
-                except Exception as e:
-                    print(f"[ERROR] Failed to parse XML for {system}: {e}")
-            else:
-                print(f"[WARN] Missing gamelist.xml for system: {system}")
-
-            # Match lightgunroms against gamelist
-            for entry in lightgunroms:
-                rom_file = entry["rom"].strip()
-                rom_basename = os.path.basename(rom_file)  # strips path and ./
-
-                # Try to match based on basename
-                for key in rom_lookup:
-                    if os.path.basename(key) == rom_basename:
-                        romdata = rom_lookup[key]
-                        matched_roms.append({
-                            "name": romdata["name"],
-                            "rom": key,
-                            "image": romdata["image"]
-                        })
-                        break  # found a match, no need to keep looking
-
-            # Keep the system with filtered roms (could be empty)
-            filtered_systems[system] = {
-                "gamelist": gamelist_path,
-                "rompath": rompath,
-                "lightgunroms": matched_roms
-            }
-        
-        self.screens = {
-            "main": load_main_screen(f"{THEME_PATH}main.xml", self.show_screen)
-        }
+        self.dents = DentPool(self.root, self.canvas, self.layout.dent_pool, self.layout.dent_expire_ms)
+        self.media = MediaIndex()
+        self.thumbs = ThumbnailCache(settings.thumb_cache_dir, settings.thumb_cache_mb, self.media)
+        self.assets = asset_cache(settings, layout.screen_size, self.media)
+        self.photos = PhotoCache(settings.photo_cache_mb)
+        self.slots = CanvasSlots(self.canvas)
+        self.page_number_id = None
+        self.prefetcher = None
+
+        # System pages (3do_1, 3do_2, etc.) are only built when first shown
+        self.library = library
+        self.screens = LazyScreens(
+            {"main": load_main_screen(f"{theme_path}main.xml", theme_path, self.layout)},
+            {system: len(data.lightgunroms) for system, data in library.items()},
+            self.layout.games_per_page,
+            partial(build_page, self.library, self.layout, theme_path, media=self.media)
+        )
+        self.images = PageImages(self.screens, self.thumbs, self.layout, theme_path, settings.baked_pages,
+                                 self.assets, self.media, page_cache(settings, layout.screen_size, self.media))
         print("Main screen loaded successfully.")
 
-        # Automatically generate system pages: 3do_1, 3do_2, etc.
-        from math import ceil
+        self.dentmain_image = ImageTk.PhotoImage(self.images.theme_image(f"{theme_path}dent_main.png"))
+        self.dentsub_image = ImageTk.PhotoImage(self.images.theme_image(f"{theme_path}dent_systems.png"))
 
-        # Default path to XML
-        XML_PATH = f"{THEME_PATH}gamescreen.xml"
+        # gun -> (canvas item, photo) or None, player 1 also follows the mouse
+        self.crosshairs = {}
+        self.crosshair(0)
 
-        if not os.path.exists(XML_PATH):
-            print(f"Error: XML file '{XML_PATH}' not found.")
-            sys.exit(1)
-
-        try:
-            tree = ET.parse(XML_PATH)
-            root = tree.getroot()
-
-            # Layout Section
-            layout = root.find("layout")
-            button = layout.find("button")
-            spacing = layout.find("spacing")
-            start = layout.find("start")
-            grid = layout.find("grid")
-            offset = layout.find("button_frame_offset")
-
-            BUTTON_WIDTH = int(button.get("width"))
-            BUTTON_HEIGHT = int(button.get("height"))
-            X_SPACING = int(spacing.get("x"))
-            Y_SPACING = int(spacing.get("y"))
-            START_X = int(start.get("x"))
-            START_Y = int(start.get("y"))
-            BUTTONS_PER_ROW = int(grid.get("buttons_per_row"))
-            ROWS_PER_PAGE = int(grid.get("rows_per_page"))
-            BUTTON_FRAME_OFFSET = int(offset.text) if offset is not None else 0  # fallback to 0 if not present
-
-            # Navigation Section
-            nav = root.find("navigation")
-            prev = nav.find("prev")
-            main = nav.find("main")
-            next_ = nav.find("next")
-
-            PREV_X = int(prev.get("x"))
-            PREV_Y = int(prev.get("y"))
-            PREV_WIDTH = int(prev.get("width"))
-            PREV_HEIGHT = int(prev.get("height"))
-
-            MAIN_X = int(main.get("x"))
-            MAIN_Y = int(main.get("y"))
-            MAIN_WIDTH = int(main.get("width"))
-            MAIN_HEIGHT = int(main.get("height"))
-
-            NEXT_X = int(next_.get("x"))
-            NEXT_Y = int(next_.get("y"))
-            NEXT_WIDTH = int(next_.get("width"))
-            NEXT_HEIGHT = int(next_.get("height"))
-
-        except ET.ParseError as e:
-            print(f"Error parsing XML file '{XML_PATH}': {e}")
-            sys.exit(1)
-            
-        # You can now use the variables as needed
-        print("Loaded screen layout successfully.")
+        # Guns either come straight from evdev or as X mouse events
+        self.gun_reader = self.open_gun_reader()
+        if self.gun_reader:
+            self.gun_tick = self.root.after(self.GUN_POLL_MS, self.poll_guns)
+        else:
+            self.canvas.bind('<Motion>', self.track_mouse)
+            self.canvas.bind('<Button-1>', self.handle_click)
+
+        if settings.prefetch_workers > 0:
+            width, height = self.layout.screen_size
+            self.prefetcher = Prefetcher(self.root, self.photos, self.images.screen_images, self.images.source_stamps,
+                                         settings.prefetch_workers, width * height * 4)
+
+        # Gamelists changed while the menu runs are reloaded without a restart
+        self.watcher = None
+        self.reloading = None
+        if settings.library_watch != "off":
+            self.reloader = ThreadPoolExecutor(max_workers=1)
+            self.watcher = FileWatcher(self.library_files(), settings.library_watch == "poll")
+            self.root.after(self.WATCH_POLL_MS, self.poll_library)
 
-        GAMES_PER_PAGE = BUTTONS_PER_ROW * ROWS_PER_PAGE
-
-        for system_name, data in filtered_systems.items():
-            lightgunroms = data["lightgunroms"]
-            total_pages = ceil(len(lightgunroms) / GAMES_PER_PAGE)
-
-            for page in range(total_pages):
-                screen_key = f"{system_name}_{page + 1}"
-                zones = []
-                page_items = lightgunroms[page * GAMES_PER_PAGE:(page + 1) * GAMES_PER_PAGE]
-
-                for idx, item in enumerate(page_items):
-                    col = idx % BUTTONS_PER_ROW
-                    row = idx // BUTTONS_PER_ROW
-
-                    x1 = START_X + col * (BUTTON_WIDTH + X_SPACING)
-                    y1 = START_Y + row * (BUTTON_HEIGHT + Y_SPACING)
-                    x2 = x1 + BUTTON_WIDTH
-                    y2 = y1 + BUTTON_HEIGHT
-
-                    zones.append({
-                        "name": f'Game {idx + 1 + (page * GAMES_PER_PAGE)}: {item.get("name", f"Game {idx + 1 + (page * GAMES_PER_PAGE)}")}',
-                        "image": item.get("image") or f"{THEME_PATH}game_default.png",
-                        "overlay": f"{THEME_PATH}game.png",
-                        "xy": (x1, y1, x2, y2),
-                        "action": lambda sys=system_name, rom=item["rom"]: __import__('subprocess').Popen(["/opt/retropie/supplementary/runcommand/runcommand.sh", "0", "_SYS_", sys, rom])
-                    })
-
-                if page > 0:
-                    prev_screen = f"{system_name}_{page}"
-                    zones.append({
-                        "name": "prev",
-                        "image": f"{THEME_PATH}button_prev.png",
-                        "xy": (PREV_X, PREV_Y, (PREV_X + PREV_WIDTH), (PREV_Y + PREV_HEIGHT)),
-                        "action": lambda ps=prev_screen: self.show_screen(ps)
-                    })
-
-                zones.append({
-                    "name": "main",
-                    "image": f"{THEME_PATH}button_main.png",
-                    "xy": (MAIN_X, MAIN_Y, (MAIN_X + MAIN_WIDTH), (MAIN_Y + MAIN_HEIGHT)),
-                    "action": lambda: self.show_screen("main")
-                })
-
-                if page < total_pages - 1:
-                    next_screen = f"{system_name}_{page + 2}"
-                    zones.append({
-                        "name": "next",
-                        "image": f"{THEME_PATH}button_next.png",
-                        "xy": (NEXT_X, NEXT_Y, (NEXT_X + NEXT_WIDTH), (NEXT_Y + NEXT_HEIGHT)),
-                        "action": lambda ns=next_screen: self.show_screen(ns)
-                    })
-                    
-                self.screens[screen_key] = {
-                    "bg": f"{THEME_PATH}{system_name}.png",
-                    "zones": zones
-                }
-      
         self.show_screen("main")
-
-    def play_sound_blocking(self, path):
-        mixer.music.load(path)
-        mixer.music.play()
-        while mixer.music.get_busy():
-            time.sleep(0.1)
+        PROFILER.record("startup.first_frame", (time.perf_counter() - STARTED) * 1000)
 
     def show_hover_text(self, text, x, y):
         if hasattr(self, "hover_text_id") and self.hover_text_id:
@@ -444,66 +486,299 @@ class GunMenu:
             self.canvas.delete(self.hover_text_id)
             self.hover_text_id = None
         
-    def track_mouse(self, event):
-        if self.target_id:
-            self.canvas.coords(self.target_id, event.x - 62, event.y - 62)
-            self.canvas.tag_raise(self.target_id)
-            self.canvas.tag_raise(self.coord_text)
-
-        # Show zone name at fixed location, only if it starts with "Game XX:"
-        zone_name = None
-        for zone in self.screens.get(self.current_screen, {}).get("zones", []):
-            x1, y1, x2, y2 = zone["xy"]
-            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
-                name = zone["name"]
-                if name.startswith("Game "):
-                    # Try to parse "Game XX: Rest of name"
-                    parts = name.split(":", 1)
-                    if len(parts) == 2 and parts[0].strip()[5:].strip().isdigit():
-                        zone_name = parts[1].strip()
-                    else:
-                        zone_name = name
+    def open_gun_reader(self):
+        # Anything failing here falls back to the mouse
+        settings = self.settings
+        if settings.input_replay:
+            try:
+                reader = ReplayReader(settings.input_replay, *self.layout.screen_size)
+            except Exception as e:
+                print(f"[WARN] Cannot replay {settings.input_replay}, using the mouse: {e}")
+                return None
+            print(f"Replaying gun events from {settings.input_replay}.")
+            return reader
+        if settings.input_backend != "evdev":
+            return None
+
+        devices = []
+        try:
+            devices = open_guns([device for device, _ in settings.guns if device])
+            if not devices:
+                print("[WARN] No lightguns found in /dev/input, using the mouse.")
+                return None
+            reader = DeviceReader(devices, *self.layout.screen_size)
+        except Exception as e:
+            print(f"[WARN] evdev input unavailable, using the mouse: {e}")
+            for device in devices:
+                device.close()
+            return None
+        print(f"Reading {len(devices)} gun(s) from evdev.")
+        return reader
+
+    def poll_guns(self):
+        while True:
+            try:
+                kind, gun, x, y, stamp = self.gun_reader.events.get_nowait()
+            except queue.Empty:
                 break
+            if kind == MOVE:
+                self.move_pointer(gun, x, y)
+            else:
+                PROFILER.record("input.gun_to_tk", (time.perf_counter() - stamp) * 1000)
+                self.fire(gun, x, y)
+        self.gun_tick = self.root.after(self.GUN_POLL_MS, self.poll_guns)
+
+    def crosshair(self, gun):
+        # Created on the gun's first move
+        if gun not in self.crosshairs:
+            configured = self.settings.guns[gun][1] if gun < len(self.settings.guns) else None
+            try:
+                photo = ImageTk.PhotoImage(self.images.theme_image(crosshair_path(self.theme_path, gun, configured)))
+                item = self.canvas.create_image(0, 0, anchor='nw', image=photo)
+                self.crosshairs[gun] = (item, photo)
+            except Exception as e:
+                print(f"Error loading target image: {e}")
+                self.crosshairs[gun] = None
+        return self.crosshairs[gun]
 
-        if zone_name:
-            # Truncate if too long
-            if len(zone_name) > GAME_NAME_WIDTH:
-                zone_name = zone_name[:GAME_NAME_WIDTH-3] + "..."
+    def track_mouse(self, event):
+        self.move_pointer(0, event.x, event.y)
+
+    def move_pointer(self, gun, x, y):
+        # Guns report faster than the display refreshes: keep only the
+        # latest position of each gun and draw it on the next frame tick
+        self.pointers[gun] = (x, y)
+        PROFILER.count("input.motion_events")
+        if self.motion_tick is None:
+            now = time.monotonic() * 1000
+            delay = max(0, int(self.last_motion_frame + self.frame_ms - now))
+            self.motion_tick = self.root.after(delay, self.apply_motion)
+
+    def apply_motion(self):
+        self.motion_tick = None
+        self.last_motion_frame = time.monotonic() * 1000
+        moved, self.pointers = self.pointers, {}
+        with PROFILER.timer("input.motion"):
+            for gun, (x, y) in moved.items():
+                self.draw_pointer(gun, x, y)
+
+    def draw_pointer(self, gun, x, y):
+        crosshair = self.crosshair(gun)
+        if crosshair:
+            item, photo = crosshair
+            self.canvas.coords(item, x - photo.width() // 2, y - photo.height() // 2)
+
+        # Show game name at fixed location, only game zones carry a label.
+        # With several guns the last one moved wins.
+        zone = self.zone_at(x, y)
+        if zone is self.hover_zone:
+            return
+        self.hover_zone = zone
+        zone_name = zone.label if zone else None
 
+        if zone_name:
             if not hasattr(self, 'zone_name_id') or self.zone_name_id is None:
                 self.zone_name_id = self.canvas.create_text(
-                    GAME_NAME_X, GAME_NAME_Y,
+                    self.layout.game_name_x, self.layout.game_name_y,
                     text=zone_name,
-                    font=GAME_NAME_FONT,
-                    fill=GAME_NAME_FILL,
+                    font=self.layout.game_name_font,
+                    fill=self.layout.game_name_fill,
                     anchor="nw"
                 )
+                self.raise_target()
             else:
                 self.canvas.itemconfig(self.zone_name_id, text=zone_name)
-                self.canvas.coords(self.zone_name_id, GAME_NAME_X, GAME_NAME_Y)
+                self.canvas.coords(self.zone_name_id, self.layout.game_name_x, self.layout.game_name_y)
                 self.canvas.tag_raise(self.zone_name_id)
+                self.raise_target()
         elif hasattr(self, 'zone_name_id') and self.zone_name_id:
             self.canvas.itemconfig(self.zone_name_id, text="")
             
+    def zone_at(self, x, y):
+        screen = self.screens.get(self.current_screen)
+        if not screen:
+            return None
+
+        # Built on first use and dropped with the screen dict
+        hit_index = screen.get("hit_index")
+        if hit_index is None:
+            hit_index = screen["hit_index"] = HitIndex(screen.get("zones", []), *self.layout.screen_size)
+        return hit_index.zone_at(x, y)
+
     def handle_click(self, event):
-        hit = False
-        zones = self.screens.get(self.current_screen, {}).get("zones", [])
-
-        for zone in zones:
-            x1, y1, x2, y2 = zone["xy"]
-            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
-                hit = True
-                threading.Thread(target=self.delayed_action, args=(zone["action"], f"{THEME_PATH}hit.mp3")).start()
-                break
+        self.fire(0, event.x, event.y)
+
+    def fire(self, gun, x, y):
+        started = time.perf_counter()
+        zone = self.zone_at(x, y)
+        hit = zone is not None
+        if hit:
+            # The action runs on the Tk loop once the hit sound has finished,
+            # further shots meanwhile only get the sound and a dent
+            self.actions.submit(partial(self.run_action, zone.action), self.sounds.play("hit"))
 
         if not hit:
-            threading.Thread(target=self.play_sound_blocking, args=(f"{THEME_PATH}miss.mp3",)).start()
+            self.sounds.play("miss")
+        PROFILER.record("input.click_to_sound", (time.perf_counter() - started) * 1000)
+
+        self.create_dent(x, y)
+
+    def library_files(self):
+        return ["inscoperoms.xml"] + [data.gamelist for data in self.library.values()]
+
+    def reload_library(self, paths, in_use):
+        # Worker thread: only systems whose files changed are parsed again.
+        # Always on a thread pool, forking next to the Tk, prefetch and
+        # watcher threads could copy a held lock into the children.
+        settings = self.settings
+        library = load_library("inscoperoms.xml", settings.library_cache, settings.loader_workers,
+                               "thread", settings.normalized_rom_match)
+        changed = library_changes(self.library, library)
+
+        # A re-scrape rewrites the gamelist and may replace art under the
+        # same file names, so the art folders of every system whose
+        # gamelist was written are listed again even if its ROMs matched
+        # the same. Art on screen is restat'ed here rather than on Tk.
+        if os.path.abspath("inscoperoms.xml") in paths:
+            reloaded = self.library.keys() | library.keys()
+        else:
+            reloaded = set(system for system, data in list(self.library.items()) + list(library.items())
+                           if os.path.abspath(data.gamelist) in paths)
+        reloaded |= changed
+        folders = set(os.path.dirname(os.path.abspath(rom.image))
+                      for system in reloaded
+                      for data in (self.library.get(system), library.get(system)) if data
+                      for rom in data.lightgunroms if rom.image)
+        self.media.forget(folders)
+        for path in in_use:
+            if os.path.dirname(os.path.abspath(path)) in folders:
+                file_stamp(path, self.media.stat)
+        return library, changed, reloaded, folders
+
+    def poll_library(self):
+        # Nothing is reloaded or applied while a game runs: changes wait for
+        # the menu, a reload finishing meanwhile is applied by resume()
+        if not self.launcher.running():
+            if self.reloading is None:
+                changed = self.watcher.changed()
+                if changed:
+                    print(f"Library files changed: {', '.join(sorted(changed))}")
+                    self.reloading = self.reloader.submit(self.reload_library, changed, self.photos.source_paths())
+            else:
+                self.finish_reload()
+        self.root.after(self.WATCH_POLL_MS, self.poll_library)
 
-        self.create_dent(event.x, event.y)
+    def finish_reload(self, redraw=True):
+        if self.reloading is None or not self.reloading.done():
+            return
+        future, self.reloading = self.reloading, None
+        try:
+            self.apply_library(*future.result(), redraw)
+        except Exception as e:
+            print(f"[ERROR] Library reload failed: {e}")
+
+    def apply_library(self, library, changed, reloaded, folders, redraw=True):
+        # Swaps the rebuilt systems in on the Tk thread. Pages and photos of
+        # other systems, backgrounds and the main screen stay cached. With
+        # redraw=False only current_screen is updated, the caller draws it.
+        if not reloaded:
+            return
+        print(f"Reloaded systems: {', '.join(sorted(reloaded))}")
+
+        def swap():
+            for system in changed:
+                if system in library:
+                    self.library[system] = library[system]
+                else:
+                    self.library.pop(system, None)
+
+        default_art = f"{self.theme_path}game_default.png"
+
+        def stale(key):
+            # Photos of changed systems, photos whose art was replaced and
+            # placeholders on reloaded pages, the scrape may have added art
+            system = (key[1] if key[0] == "page" else key[0]).rpartition("_")[0]
+            if system in changed:
+                return True
+            for path, stamp in self.photos.sources(key):
+                if path == default_art and system in reloaded:
+                    return True
+                if os.path.dirname(os.path.abspath(path)) in folders and file_stamp(path, self.media.stat) != stamp:
+                    return True
+            return False
+
+        if self.prefetcher:
+            self.prefetcher.cancel()
+        # Pages of reloaded systems are rebuilt from the fresh folder listings
+        self.screens.reload({system: len(data.lightgunroms) for system, data in library.items()}, reloaded, swap)
+        self.photos.discard(stale)
+        # Systems added to inscoperoms.xml bring new gamelists to watch
+        self.watcher.set_paths(self.library_files())
+
+        name = self.current_screen
+        system, _, page = name.rpartition("_")
+        if system in reloaded:
+            if name not in self.screens:
+                pages = self.screens.page_counts.get(system, 0)
+                name = f"{system}_{min(int(page), pages)}" if pages else "main"
+            if redraw:
+                self.show_screen(name)
+            else:
+                self.current_screen = name
+        elif redraw and self.prefetcher:
+            self.prefetcher.schedule(self.adjacent_screens(name))
+
+    def run_action(self, action):
+        # Every zone action, main.xml and system pages alike. A launch
+        # returns its Future so the action queue waits for the spawn.
+        if action.kind == NAVIGATE:
+            self.show_screen(action.target)
+        elif action.kind == LAUNCH:
+            return self.launch_game(action.target, action.rom)
+        else:
+            print(f"[WARN] Unknown action: {action.kind}")
+        return None
+
+    def launch_game(self, system, rom):
+        return self.launcher.launch(system, rom)
+
+    def suspend(self):
+        # The emulator gets the CPU and RAM while it runs: no pointer
+        # handling, no prefetching and no decoded images kept around
+        if self.gun_reader:
+            # Hands grabbed guns over to the emulator
+            self.gun_reader.pause()
+            self.root.after_cancel(self.gun_tick)
+            self.gun_tick = None
+        else:
+            self.canvas.unbind('<Motion>')
+            self.canvas.unbind('<Button-1>')
+        if self.motion_tick is not None:
+            self.root.after_cancel(self.motion_tick)
+            self.motion_tick = None
+        if self.prefetcher:
+            self.prefetcher.cancel()
 
-    def delayed_action(self, action, sound_path):
-        self.play_sound_blocking(sound_path)
-        action()
+        self.clear_dents()
+        self.slots.show([])
+        if self.image_id:
+            self.canvas.itemconfig(self.image_id, image="")
+        self.bg_image = None
+        self.photos.clear()
+
+    def resume(self, returncode):
+        print(f"Game exited with code {returncode}.")
+        # Redraws the page and prefetches its neighbours again, with any
+        # library reload that finished while the game ran
+        self.finish_reload(redraw=False)
+        self.show_screen(self.current_screen)
+        self.actions.quiet()
+        if self.gun_reader:
+            self.gun_reader.resume()
+            self.gun_tick = self.root.after(self.GUN_POLL_MS, self.poll_guns)
+        else:
+            self.canvas.bind('<Motion>', self.track_mouse)
+            self.canvas.bind('<Button-1>', self.handle_click)
 
     def create_dent(self, x, y):
         if self.current_screen == "main":
@@ -511,27 +786,65 @@ class GunMenu:
         else:
             self.dent_image = self.dentsub_image
 
-        dent = self.canvas.create_image(x, y, image=self.dent_image)
-        self.dents.append(dent)
+        self.dents.place(x, y, self.dent_image)
+        self.raise_target()
+
+    def raise_target(self):
+        # Crosshairs stay above anything drawn after them
+        for crosshair in self.crosshairs.values():
+            if crosshair:
+                self.canvas.tag_raise(crosshair[0])
+        self.canvas.tag_raise(self.coord_text)
 
     def clear_dents(self):
-        for dent in self.dents:
-            self.canvas.delete(dent)
-        self.dents = []
+        self.dents.clear()
+
+    def cached_photo(self, key, load_image, stage="screen.zone_decode"):
+        photo = self.photos.get(key)
+        if photo is None:
+            PROFILER.count("photo_cache.miss")
+            with PROFILER.timer(stage):
+                photo = ImageTk.PhotoImage(load_image())
+            self.photos.put(key, photo, self.images.source_stamps(load_image))
+        else:
+            PROFILER.count("photo_cache.hit")
+        return photo
+
+    def adjacent_screens(self, name):
+        # Screens the next trigger pull is most likely to open
+        if name == "main":
+            return [zone.action.target for zone in self.screens["main"]["zones"]]
+
+        match = re.search(r"^(.*)_(\d+)$", name)
+        if not match:
+            return []
+        system, page = match.group(1), int(match.group(2))
+        candidates = [f"{system}_{page + 1}", f"{system}_{page - 1}", "main"]
+        return [screen for screen in candidates if screen in self.screens]
 
     def show_screen(self, name):
         if name not in self.screens:
             print(f"[ERROR] Screen '{name}' not found!")
             return
+        started = time.perf_counter()
+        if self.prefetcher:
+            self.prefetcher.cancel()
         self.clear_dents()
         self.current_screen = name
+        # Hover text belongs to the old screen's zones
+        self.hover_zone = None
+        if getattr(self, "zone_name_id", None):
+            self.canvas.itemconfig(self.zone_name_id, text="")
         screen = self.screens.get(name, {})
         bg_path = screen.get("bg")
+        images = self.images.screen_images(name)
+        # A baked page is the background with every zone image already on it
+        baked = ("page", name) in images
+        bg_key = ("page", name) if baked else ("bg", bg_path)
 
         # Load and display background image
         try:
-            image = Image.open(bg_path).resize((1920, 1080))
-            self.bg_image = ImageTk.PhotoImage(image)
+            self.bg_image = self.cached_photo(bg_key, images[bg_key], "screen.background")
             if self.image_id:
                 self.canvas.itemconfig(self.image_id, image=self.bg_image)
             else:
@@ -540,161 +853,131 @@ class GunMenu:
         except Exception as e:
             print(f"Error loading background: {e}")
 
-        # Clear previous zone images if any
-        if hasattr(self, 'zone_image_ids'):
-            for zid in self.zone_image_ids:
-                self.canvas.delete(zid)
-        self.zone_image_ids = []
-
-
-        # Default path to XML
-        XML_PATH = f"{THEME_PATH}gamescreen.xml"
-
-        if not os.path.exists(XML_PATH):
-            print(f"Error: XML file '{XML_PATH}' not found.")
-            sys.exit(1)
-
-        try:
-            tree = ET.parse(XML_PATH)
-            root = tree.getroot()
-
-            # Layout Section
-            layout = root.find("layout")
-            button = layout.find("button")
-            spacing = layout.find("spacing")
-            start = layout.find("start")
-            grid = layout.find("grid")
-            offset = layout.find("button_frame_offset")
-            page_no = layout.find("page_no")
-
-            BUTTON_WIDTH = int(button.get("width"))
-            BUTTON_HEIGHT = int(button.get("height"))
-            X_SPACING = int(spacing.get("x"))
-            Y_SPACING = int(spacing.get("y"))
-            START_X = int(start.get("x"))
-            START_Y = int(start.get("y"))
-            BUTTONS_PER_ROW = int(grid.get("buttons_per_row"))
-            ROWS_PER_PAGE = int(grid.get("rows_per_page"))
-            BUTTON_FRAME_OFFSET = int(offset.text) if offset is not None else 0
-
-            if page_no is not None:
-                PAGE_NUMBER_X = int(page_no.get("x"))
-                PAGE_NUMBER_Y = int(page_no.get("y"))
-                PAGE_NUMBER_FONT = eval(page_no.get("font"))
-                PAGE_NUMBER_FILL = page_no.get("colour")
-            else:
-                PAGE_NUMBER_X = 1720
-                PAGE_NUMBER_Y = 1020
-                PAGE_NUMBER_FONT = ("Arial", 24, "bold")
-                PAGE_NUMBER_FILL = "white"
-
-            # Navigation Section
-            nav = root.find("navigation")
-            prev = nav.find("prev")
-            main = nav.find("main")
-            next_ = nav.find("next")
-
-            PREV_X = int(prev.get("x"))
-            PREV_Y = int(prev.get("y"))
-            PREV_WIDTH = int(prev.get("width"))
-            PREV_HEIGHT = int(prev.get("height"))
-
-            MAIN_X = int(main.get("x"))
-            MAIN_Y = int(main.get("y"))
-            MAIN_WIDTH = int(main.get("width"))
-            MAIN_HEIGHT = int(main.get("height"))
-
-            NEXT_X = int(next_.get("x"))
-            NEXT_Y = int(next_.get("y"))
-            NEXT_WIDTH = int(next_.get("width"))
-            NEXT_HEIGHT = int(next_.get("height"))
-
-        except ET.ParseError as e:
-            print(f"Error parsing XML file '{XML_PATH}': {e}")
-            sys.exit(1)
-
-        print("Loaded screen layout successfully.")
-
-        # Remove previous page number if it exists
-        if hasattr(self, "page_number_id") and self.page_number_id:
-            self.canvas.delete(self.page_number_id)
-            self.page_number_id = None
+        layout = self.layout
 
         # Extract page number from screen name (e.g., "3do_2")
         match = re.search(r"_(\d+)$", name)
         if match:
-            page_num = int(match.group(1))
-            self.page_number_id = self.canvas.create_text(
-                PAGE_NUMBER_X,
-                PAGE_NUMBER_Y,
-                text=f"Page {page_num}",
-                font=PAGE_NUMBER_FONT,
-                fill=PAGE_NUMBER_FILL,
-                anchor="se"
-            )
-        else:
-            self.page_number_id = None
-
-
-        # Draw each zone image and overlay
-        for zone in screen.get("zones", []):
+            page_text = f"Page {int(match.group(1))}"
+            if self.page_number_id is None:
+                self.page_number_id = self.canvas.create_text(
+                    layout.page_no_x,
+                    layout.page_no_y,
+                    text=page_text,
+                    font=layout.page_no_font,
+                    fill=layout.page_no_fill,
+                    anchor="se"
+                )
+            else:
+                self.canvas.itemconfig(self.page_number_id, text=page_text, state="normal")
+        elif self.page_number_id is not None:
+            self.canvas.itemconfig(self.page_number_id, state="hidden")
+
+        # Each zone image goes to a slot that keeps its canvas item between
+        # screens: grid position for games, zone name for buttons
+        slots = []
+        game_idx = 0
+        for zone in ([] if baked else screen.get("zones", [])):
             try:
-                x1, y1, x2, y2 = zone["xy"]
-                image_path = zone.get("image")
-
-                if not image_path or not os.path.exists(image_path):
-                    print(f"[WARN] Image not found for zone '{zone.get('name')}' at path: {image_path}")
-                    image_path = f"{THEME_PATH}game_default.png"
-
-                is_nav_button = zone["name"] in ["main", "prev", "next"]
-                self.zone_photos = getattr(self, 'zone_photos', {})
-
-                if not is_nav_button and zone.get("overlay"):
-                    # System/game button: offset +8 and resize to 234x184
-                    base_img = Image.open(image_path).resize(((BUTTON_WIDTH - (BUTTON_FRAME_OFFSET * 2)), (BUTTON_HEIGHT - (BUTTON_FRAME_OFFSET * 2))), Image.ANTIALIAS)
-
-                    # Replace transparency with black if present
-                    if base_img.mode in ("RGBA", "LA"):
-                        black_bg = Image.new("RGB", base_img.size, (0, 0, 0))
-                        black_bg.paste(base_img, mask=base_img.split()[-1])  # Use alpha channel as mask
-                        base_img = black_bg
-                    else:
-                        base_img = base_img.convert("RGB")
-
-                    base_photo = ImageTk.PhotoImage(base_img)
-                    self.zone_photos[zone["name"]] = base_photo
-
-                    base_id = self.canvas.create_image(x1 + BUTTON_FRAME_OFFSET, y1 + BUTTON_FRAME_OFFSET, anchor='nw', image=base_photo)
-                    self.zone_image_ids.append(base_id)
-
-                    overlay_path = zone.get("overlay")
-                    if overlay_path and os.path.exists(overlay_path):
-                        overlay_img = Image.open(overlay_path).resize((250, 200), Image.ANTIALIAS)
-                        overlay_photo = ImageTk.PhotoImage(overlay_img)
-                        self.zone_photos[zone["name"] + "_overlay"] = overlay_photo
-
-                        overlay_id = self.canvas.create_image(x1, y1, anchor='nw', image=overlay_photo)
-                        self.zone_image_ids.append(overlay_id)
+                x1, y1, x2, y2 = zone.xy
+                base_key = (name, zone.name, "base")
+
+                if base_key in images:
+                    # System/game button: offset +8 and resize to 234x184, flattened onto black
+                    base_photo = self.cached_photo(base_key, images[base_key])
+                    slots.append((("base", game_idx), (x1 + layout.button_frame_offset, y1 + layout.button_frame_offset), base_photo))
+
+                    overlay_key = ("overlay", zone.overlay)
+                    if overlay_key in images:
+                        overlay_photo = self.cached_photo(overlay_key, images[overlay_key])
+                        slots.append((("overlay", game_idx), (x1, y1), overlay_photo))
+                    game_idx += 1
                 else:
                     # nav buttons: normal size and position
-                    base_img = Image.open(image_path).resize((x2 - x1, y2 - y1), Image.ANTIALIAS)
-                    base_photo = ImageTk.PhotoImage(base_img)
-                    self.zone_photos[zone["name"]] = base_photo
-
-                    base_id = self.canvas.create_image(x1, y1, anchor='nw', image=base_photo)
-                    self.zone_image_ids.append(base_id)
+                    base_photo = self.cached_photo((name, zone.name, "button"), images[(name, zone.name, "button")])
+                    slots.append((("button", zone.name), (x1, y1), base_photo))
 
             except Exception as e:
-                print(f"[ERROR] Failed to load zone '{zone.get('name')}': {e}")
-        
-        # Ensure coordinate text and target always on top
-        self.canvas.tag_raise(self.coord_text)
-        if self.target_id:
-            self.canvas.tag_raise(self.target_id)
-            self.canvas.tag_raise(self.coord_text)
-        
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = GunMenu(root)
+                print(f"[ERROR] Failed to load zone '{zone.name}': {e}")
+
+        with PROFILER.timer("screen.canvas"):
+            self.slots.show(slots)
+
+        # Texts stay above zone items created for the first time
+        if self.page_number_id is not None:
+            self.canvas.tag_raise(self.page_number_id)
+        if getattr(self, "zone_name_id", None):
+            self.canvas.tag_raise(self.zone_name_id)
+
+        # Ensure coordinate text and targets always on top
+        self.raise_target()
+
+        if self.prefetcher:
+            self.prefetcher.schedule(self.adjacent_screens(name))
+        PROFILER.record("screen.show", (time.perf_counter() - started) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description="Gun driven menu for RetroPie")
+    commands = parser.add_subparsers(dest="command")
+    index = commands.add_parser("build-index", help="match the library into its cache without starting the menu")
+    index.add_argument("--pages", type=int, default=0, metavar="N",
+                       help="also render thumbnails for the first N pages of each system")
+    index.add_argument("--resolution", type=parse_resolution, metavar="WxH",
+                       help="screen size to scale theme images for (default: <resolution> or the framebuffer)")
+    record = commands.add_parser("record-input", help="record raw gun events for <input_replay>")
+    record.add_argument("path", help="JSON lines file to write")
+    record.add_argument("--seconds", type=float, help="stop after this long instead of on Ctrl+C")
+    args = parser.parse_args()
+
+    try:
+        check_base_files()
+        print("All required base files and folder exist.")
+        settings = load_settings("settings.xml")
+
+        PROFILER.enabled = settings.profiling
+        PROFILER.log_path = settings.profiling_log
+        atexit.register(PROFILER.dump)
+
+        check_theme(settings.theme_path)
+        print("All required theme files are present.")
+        layout = load_theme_layout(f"{settings.theme_path}gamescreen.xml")
+        PROFILER.record("startup.settings_theme", (time.perf_counter() - STARTED) * 1000)
+        print("Loaded screen layout successfully.")
+
+        if args.command == "build-index":
+            # No X yet, the console framebuffer tells the screen size
+            size = args.resolution or settings.resolution or framebuffer_resolution() or DESIGN_SIZE
+            build_index(settings, layout.scaled(size), "inscoperoms.xml", args.pages)
+            return
+        if args.command == "record-input":
+            try:
+                devices = open_guns([device for device, _ in settings.guns if device])
+            except (RuntimeError, OSError) as e:
+                raise LgsError(f"cannot open lightguns: {e}")
+            if not devices:
+                raise LgsError("no lightguns found in /dev/input.")
+            print(f"Recording {len(devices)} gun(s) to {args.path}, Ctrl+C stops.")
+            try:
+                record_input(devices, args.path, args.seconds)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        # Loaded before Tk and the mixer start their threads: the default
+        # loader pool forks, and a child forked from a threaded process can
+        # inherit a lock some other thread was holding
+        library = load_library("inscoperoms.xml", settings.library_cache, settings.loader_workers,
+                               settings.loader_pool, settings.normalized_rom_match)
+
+        root = tk.Tk()
+        size = settings.resolution or (root.winfo_screenwidth(), root.winfo_screenheight())
+        GunMenu(root, settings, layout.scaled(size), library)
+    except LgsError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
     root.config(cursor="none")
     root.mainloop()
+
+if __name__ == "__main__":
+    main()
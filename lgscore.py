@@ -0,0 +1,1509 @@
+from PIL import Image
+import threading
+import time
+import xml.etree.ElementTree as ET
+import os
+import re
+import hashlib
+import ast
+import pickle
+import shlex
+import ctypes
+import errno
+import select
+import ctypes.util
+import struct
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from collections.abc import Mapping
+from math import ceil
+from functools import cached_property, partial
+from dataclasses import dataclass, replace
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Library layer of LGS: settings, theme layout, gamelist loading and
+# matching, pagination and image preparation. Nothing here needs Tk or a
+# display, so the pipeline can run in worker processes, benchmarks and
+# "lgs.py build-index" before X starts. lgs.py is the Tk front end.
+
+# Base files and folders
+BASE_FILES = ["lgs.py", "lgscore.py", "lgsinput.py", "inscoperoms.xml", "settings.xml"]
+BASE_FOLDERS = ["themes"]
+
+# Required theme files
+REQUIRED_THEME_FILES = [
+    "tag_3do.png", "gamescreen.xml", "3do.png", "tag_nes.png", "dent_systems.png",
+    "tag_segacd.png", "button_next.png", "game_default.png", "tag_atari2600.png", "main.xml",
+    "tag_zxspectrum.png", "button_prev.png", "hit.mp3", "tag_sega32x.png", "tag_dreamcast.png",
+    "tag_saturn.png", "tag_mastersystem.png", "tag_mame.png", "atari2600.png", "target.png",
+    "tag_atari7800.png", "tag_megadrive.png", "tag_psx.png", "button_main.png", "dent_main.png",
+    "Logo.png", "Logo_mini.png", "game.png", "main.png", "tag_snes.png", "miss.mp3",
+    "atari7800.png", "dreamcast.png", "mame-libretro.png", "mastersystem.png",
+    "megadrive.png", "nes.png", "psx.png", "saturn.png",
+    "sega32x.png", "segacd.png", "snes.png", "zxspectrum.png",
+]
+
+# Themes are drawn for this screen size and scaled once to the real one
+DESIGN_SIZE = (1920, 1080)
+
+# Library and screen records. Big MAME/PSX sets mean hundreds of thousands
+# of ROMs and thousands of zones, so they are tuples, not dicts: no
+# per-instance dict, and they pickle small into the library cache.
+class Rom(NamedTuple):
+    name: str
+    rom: str
+    image: Optional[str] = None
+
+class System(NamedTuple):
+    gamelist: str
+    rompath: str
+    lightgunroms: list
+
+# Zone actions are plain data, the front end runs them all in one place
+NAVIGATE = "navigate"
+LAUNCH = "launch"
+
+class Action(NamedTuple):
+    kind: str
+    # Screen to show, or system of the ROM to launch
+    target: str
+    rom: Optional[str] = None
+
+class Zone(NamedTuple):
+    # name is "main", "prev", "next", a main.xml zone name or the game number
+    name: object
+    xy: tuple
+    image: str
+    action: Action
+    overlay: Optional[str] = None
+    label: Optional[str] = None
+
+class LgsError(Exception):
+    # Missing or broken base files, settings or theme; the front ends print
+    # the message and exit
+    pass
+
+def check_base_files(base_dir=""):
+    missing = [f for f in BASE_FILES if not os.path.isfile(os.path.join(base_dir, f))]
+    missing += [d for d in BASE_FOLDERS if not os.path.isdir(os.path.join(base_dir, d))]
+    if missing:
+        raise LgsError(f"One or more required files or folders are missing: {', '.join(missing)}")
+
+class Profiler:
+    # Stage timers (ms) and counters for tuning cabinets in the field. Every
+    # call is a cheap no-op unless <profiling> is on in settings.xml.
+    MAX_SAMPLES = 10000
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # name -> [count, total, max, recent samples]
+        self.timers = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            stat = self.timers.get(name)
+            if stat is None:
+                stat = self.timers[name] = [0, 0.0, 0.0, deque(maxlen=self.MAX_SAMPLES)]
+            stat[0] += 1
+            stat[1] += ms
+            stat[2] = max(stat[2], ms)
+            stat[3].append(ms)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def drain(self):
+        # Hands samples from a worker process back to the parent
+        with self.lock:
+            timers, counters = self.timers, self.counters
+            self.reset()
+        return timers, counters
+
+    def merge(self, drained):
+        timers, counters = drained
+        with self.lock:
+            for name, (count, total, longest, samples) in timers.items():
+                stat = self.timers.get(name)
+                if stat is None:
+                    stat = self.timers[name] = [0, 0.0, 0.0, deque(maxlen=self.MAX_SAMPLES)]
+                stat[0] += count
+                stat[1] += total
+                stat[2] = max(stat[2], longest)
+                stat[3].extend(samples)
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        lines = [f"{'stage':<28} {'count':>7} {'total':>10} {'p50':>8} {'p95':>8} {'max':>8}"]
+        with self.lock:
+            for name in sorted(self.timers):
+                count, total, longest, samples = self.timers[name]
+                ordered = sorted(samples)
+                p50 = ordered[int(0.50 * (len(ordered) - 1))]
+                p95 = ordered[int(0.95 * (len(ordered) - 1))]
+                lines.append(f"{name:<28} {count:>7} {total:>10.1f} {p50:>8.2f} {p95:>8.2f} {longest:>8.2f}")
+            for name in sorted(self.counters):
+                lines.append(f"{name:<28} {self.counters[name]:>7}")
+        return "\n".join(lines)
+
+    def dump(self):
+        if not self.enabled:
+            return
+        report = f"LGS profile {time.strftime('%Y-%m-%d %H:%M:%S')} (times in ms)\n{self.report()}\n"
+        if not self.log_path:
+            print(report)
+            return
+        try:
+            with open(self.log_path, "a") as f:
+                f.write(report + "\n")
+        except OSError as e:
+            print(f"[WARN] Failed to write profile to {self.log_path}: {e}")
+            print(report)
+
+# Shared by the loaders and the GUI, enabled by the front end from settings
+PROFILER = Profiler()
+
+def parse_bool(value):
+    value = value.lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(value)
+
+def parse_resolution(value):
+    # "1280x720" -> (1280, 720)
+    width, sep, height = value.lower().partition("x")
+    size = (int(width), int(height))
+    if not sep or min(size) < 1:
+        raise ValueError(value)
+    return size
+
+def framebuffer_resolution():
+    # Screen size from the console framebuffer, for use before X runs
+    try:
+        with open("/sys/class/graphics/fb0/virtual_size") as f:
+            return parse_resolution(f.read().strip().replace(",", "x"))
+    except (OSError, ValueError):
+        return None
+
+def read_setting(settings_root, name, default, cast=str):
+    # Optional settings fall back to their default when missing or invalid
+    elem = settings_root.find(name)
+    if elem is None or elem.text is None or not elem.text.strip():
+        return default
+    try:
+        return cast(elem.text.strip())
+    except ValueError:
+        print(f"[WARN] Invalid value for <{name}> in settings.xml, using default: {default}")
+        return default
+
+@dataclass(frozen=True)
+class Settings:
+    theme_path: str
+    thumb_cache_dir: str
+    thumb_cache_mb: int
+    photo_cache_mb: int
+    prefetch_workers: int
+    normalized_rom_match: bool
+    loader_workers: int
+    loader_pool: str
+    baked_pages: bool
+    launch_command: list
+    target_fps: int
+    sound_channels: int
+    action_debounce_ms: int
+    library_cache: str
+    library_watch: str
+    profiling: bool
+    profiling_log: str
+    input_backend: str
+    guns: tuple
+    input_replay: str
+    resolution: tuple
+    asset_cache_dir: str
+    asset_cache_mb: int
+    page_cache_mb: int
+
+def load_settings(xml_path="settings.xml"):
+    try:
+        root = ET.parse(xml_path).getroot()
+    except ET.ParseError as e:
+        raise LgsError(f"Failed to parse settings.xml: {e}")
+
+    selected_theme_elem = root.find("selected_theme")
+    if selected_theme_elem is None or not (selected_theme_elem.text or "").strip():
+        raise LgsError("<selected_theme> is missing or empty in settings.xml.")
+
+    loader_pool = read_setting(root, "loader_pool", "process")
+    if loader_pool not in ("process", "thread"):
+        print("[WARN] Invalid value for <loader_pool> in settings.xml, using default: process")
+        loader_pool = "process"
+
+    library_watch = read_setting(root, "library_watch", "auto")
+    if library_watch not in ("auto", "poll", "off"):
+        print("[WARN] Invalid value for <library_watch> in settings.xml, using default: auto")
+        library_watch = "auto"
+
+    input_backend = read_setting(root, "input_backend", "mouse")
+    if input_backend not in ("mouse", "evdev"):
+        print("[WARN] Invalid value for <input_backend> in settings.xml, using default: mouse")
+        input_backend = "mouse"
+
+    return Settings(
+        # Themes sit next to settings.xml, with a trailing slash
+        theme_path=os.path.join(os.path.dirname(xml_path), "themes", selected_theme_elem.text.strip(), ""),
+        # Pre-baked button thumbnails cache
+        thumb_cache_dir=os.path.expanduser(read_setting(
+            root, "thumbnail_cache", os.path.join("~", ".cache", "lgs", "thumbs"))),
+        thumb_cache_mb=read_setting(root, "thumbnail_cache_mb", 64, int),
+        # In-memory budget for decoded screen images
+        photo_cache_mb=read_setting(root, "photo_cache_mb", 96, int),
+        # Worker threads warming adjacent screens, 0 disables prefetching
+        prefetch_workers=read_setting(root, "prefetch_workers", 2, int),
+        # Second matching pass ignoring case, extension and tags like "(USA)"
+        normalized_rom_match=read_setting(root, "normalized_rom_match", False, parse_bool),
+        # Parallel gamelist loading at startup, 1 loads systems one by one
+        loader_workers=read_setting(root, "loader_workers", min(4, os.cpu_count() or 1), int),
+        loader_pool=loader_pool,
+        # System pages composited into a single cached image
+        baked_pages=read_setting(root, "baked_pages", False, parse_bool),
+        # Emulator launch, {system} and {rom} are filled in per game
+        launch_command=shlex.split(read_setting(
+            root, "launch_command", "/opt/retropie/supplementary/runcommand/runcommand.sh 0 _SYS_ {system} {rom}")),
+        # Crosshair and hover text are redrawn at most this often
+        target_fps=max(1, read_setting(root, "target_fps", 60, int)),
+        # Mixer channels kept for shot sounds, overlapping shots mix
+        sound_channels=max(1, read_setting(root, "sound_channels", 4, int)),
+        # Shots within this window after an action are ignored
+        action_debounce_ms=max(0, read_setting(root, "action_debounce_ms", 300, int)),
+        # Matched library kept between runs, rebuilt per system when files change
+        library_cache=os.path.expanduser(read_setting(
+            root, "library_cache", os.path.join("~", ".cache", "lgs", "library.pickle"))),
+        # Gamelist and inscoperoms.xml changes reloaded while running
+        library_watch=library_watch,
+        # Stage timings summarised at exit, printed or appended to a log file
+        profiling=read_setting(root, "profiling", False, parse_bool),
+        profiling_log=os.path.expanduser(read_setting(root, "profiling_log", "")),
+        # Guns read from /dev/input instead of X pointer events
+        input_backend=input_backend,
+        # (device, crosshair) per player, either may be None
+        guns=tuple((gun.get("device"), gun.get("crosshair")) for gun in root.findall("guns/gun")),
+        # Recorded gun events played back instead of real guns
+        input_replay=os.path.expanduser(read_setting(root, "input_replay", "")),
+        # Screen size, detected when missing
+        resolution=read_setting(root, "resolution", None, parse_resolution),
+        # Theme images pre-scaled to the screen, kept per resolution
+        asset_cache_dir=os.path.expanduser(read_setting(
+            root, "asset_cache", os.path.join("~", ".cache", "lgs", "assets"))),
+        asset_cache_mb=read_setting(root, "asset_cache_mb", 256, int),
+        # Baked pages, kept apart so they never evict game art or theme images
+        page_cache_mb=read_setting(root, "page_cache_mb", 512, int),
+    )
+
+def check_theme(theme_path):
+    if not os.path.isdir(theme_path):
+        raise LgsError("selected theme folder missing.")
+
+    missing_files = [f for f in REQUIRED_THEME_FILES if not os.path.isfile(os.path.join(theme_path, f))]
+    if missing_files:
+        raise LgsError("The following required files are missing in the theme folder:\n" +
+                       "\n".join(f" - {file}" for file in missing_files))
+
+@dataclass(frozen=True)
+class ThemeLayout:
+    # Geometry from gamescreen.xml, parsed once and shared by page
+    # generation, rendering and hit-testing
+    button_width: int
+    button_height: int
+    button_frame_offset: int
+    x_spacing: int
+    y_spacing: int
+    start_x: int
+    start_y: int
+    buttons_per_row: int
+    rows_per_page: int
+    page_no_x: int
+    page_no_y: int
+    page_no_font: tuple
+    page_no_fill: str
+    game_name_x: int
+    game_name_y: int
+    game_name_font: tuple
+    game_name_fill: str
+    game_name_width: int
+    prev_xy: tuple
+    main_xy: tuple
+    next_xy: tuple
+    dent_pool: int
+    dent_expire_ms: int
+    screen_size: tuple = DESIGN_SIZE
+
+    @property
+    def games_per_page(self):
+        return self.buttons_per_row * self.rows_per_page
+
+    @property
+    def base_size(self):
+        # Game art sits inside the button frame
+        return (self.button_width - (self.button_frame_offset * 2),
+                self.button_height - (self.button_frame_offset * 2))
+
+    def scaled(self, screen_size):
+        # Geometry for another screen size, computed once at startup. Axes
+        # scale separately so 4:3 screens get the whole theme, fonts follow
+        # the height.
+        screen_size = tuple(screen_size)
+        if screen_size == self.screen_size:
+            return self
+        sx = screen_size[0] / DESIGN_SIZE[0]
+        sy = screen_size[1] / DESIGN_SIZE[1]
+
+        def font(value):
+            if isinstance(value, tuple) and len(value) > 1 and isinstance(value[1], int):
+                return (value[0], max(1, round(value[1] * sy))) + value[2:]
+            return value
+
+        def box(xy):
+            return (round(xy[0] * sx), round(xy[1] * sy), round(xy[2] * sx), round(xy[3] * sy))
+
+        return replace(
+            self,
+            button_width=round(self.button_width * sx),
+            button_height=round(self.button_height * sy),
+            button_frame_offset=round(self.button_frame_offset * min(sx, sy)),
+            x_spacing=round(self.x_spacing * sx),
+            y_spacing=round(self.y_spacing * sy),
+            start_x=round(self.start_x * sx),
+            start_y=round(self.start_y * sy),
+            page_no_x=round(self.page_no_x * sx),
+            page_no_y=round(self.page_no_y * sy),
+            page_no_font=font(self.page_no_font),
+            game_name_x=round(self.game_name_x * sx),
+            game_name_y=round(self.game_name_y * sy),
+            game_name_font=font(self.game_name_font),
+            prev_xy=box(self.prev_xy),
+            main_xy=box(self.main_xy),
+            next_xy=box(self.next_xy),
+            screen_size=screen_size,
+        )
+
+    def scale_box(self, xy):
+        # Design coordinates to screen coordinates
+        sx = self.screen_size[0] / DESIGN_SIZE[0]
+        sy = self.screen_size[1] / DESIGN_SIZE[1]
+        return (round(xy[0] * sx), round(xy[1] * sy), round(xy[2] * sx), round(xy[3] * sy))
+
+    def scale_size(self, size):
+        _, _, width, height = self.scale_box((0, 0) + tuple(size))
+        return (max(1, width), max(1, height))
+
+    def button_xy(self, idx):
+        col = idx % self.buttons_per_row
+        row = idx // self.buttons_per_row
+
+        x1 = self.start_x + col * (self.button_width + self.x_spacing)
+        y1 = self.start_y + row * (self.button_height + self.y_spacing)
+        return (x1, y1, x1 + self.button_width, y1 + self.button_height)
+
+    @cached_property
+    def button_boxes(self):
+        # button_xy() of every grid slot, shared by the zones of all pages
+        return tuple(self.button_xy(idx) for idx in range(self.games_per_page))
+
+def parse_font(value):
+    # Fonts are written as Tk font tuples, e.g. "('Arial', 18, 'bold')"
+    font = ast.literal_eval(value)
+    if isinstance(font, str):
+        return font
+    if not isinstance(font, tuple) or not font or not isinstance(font[0], str):
+        raise ValueError(f"invalid font {value!r}")
+    return font
+
+def nav_xy(elem):
+    x = int(elem.get("x"))
+    y = int(elem.get("y"))
+    return (x, y, x + int(elem.get("width")), y + int(elem.get("height")))
+
+def load_theme_layout(xml_path):
+    if not os.path.exists(xml_path):
+        raise LgsError(f"XML file '{xml_path}' not found.")
+
+    try:
+        root = ET.parse(xml_path).getroot()
+
+        # Layout Section
+        layout = root.find("layout")
+        button = layout.find("button")
+        spacing = layout.find("spacing")
+        start = layout.find("start")
+        grid = layout.find("grid")
+        offset = layout.find("button_frame_offset")
+        page_no = layout.find("page_no")
+        game_name = layout.find("game_name")
+        dents = layout.find("dents")
+
+        # Navigation Section
+        nav = root.find("navigation")
+
+        theme_layout = ThemeLayout(
+            button_width=int(button.get("width")),
+            button_height=int(button.get("height")),
+            button_frame_offset=int(offset.text) if offset is not None else 0,  # fallback to 0 if not present
+            x_spacing=int(spacing.get("x")),
+            y_spacing=int(spacing.get("y")),
+            start_x=int(start.get("x")),
+            start_y=int(start.get("y")),
+            buttons_per_row=int(grid.get("buttons_per_row")),
+            rows_per_page=int(grid.get("rows_per_page")),
+            page_no_x=int(page_no.get("x")) if page_no is not None else 1720,
+            page_no_y=int(page_no.get("y")) if page_no is not None else 1020,
+            page_no_font=parse_font(page_no.get("font")) if page_no is not None else ("Arial", 24, "bold"),
+            page_no_fill=page_no.get("colour") if page_no is not None else "white",
+            game_name_x=int(game_name.get("x")),
+            game_name_y=int(game_name.get("y")),
+            game_name_font=parse_font(game_name.get("font")),
+            game_name_fill=game_name.get("colour"),
+            game_name_width=int(game_name.get("width")),
+            prev_xy=nav_xy(nav.find("prev")),
+            main_xy=nav_xy(nav.find("main")),
+            next_xy=nav_xy(nav.find("next")),
+            # Shot dents recycled from a fixed pool, 0 expiry keeps them until the screen changes
+            dent_pool=int(dents.get("pool", 32)) if dents is not None else 32,
+            dent_expire_ms=int(dents.get("expire_ms", 0)) if dents is not None else 0,
+        )
+
+    except ET.ParseError as e:
+        raise LgsError(f"Failed to parse XML file '{xml_path}': {e}")
+    except Exception as e:
+        raise LgsError(f"Failed to load screen layout from '{xml_path}': {e}")
+
+    if theme_layout.buttons_per_row < 1 or theme_layout.rows_per_page < 1:
+        raise LgsError(f"grid in '{xml_path}' needs at least one row and one button per row.")
+    if theme_layout.dent_pool < 1:
+        raise LgsError(f"dents pool in '{xml_path}' must be at least 1.")
+    if min(theme_layout.base_size) < 1:
+        raise LgsError(f"button_frame_offset in '{xml_path}' leaves no room for game art.")
+
+    return theme_layout
+
+def load_main_screen(xml_path, theme_path, layout):
+    if not os.path.exists(xml_path):
+        raise LgsError(f"{xml_path} not found.")
+
+    try:
+        tree = ET.parse(xml_path)
+    except ET.ParseError as e:
+        raise LgsError(f"Failed to parse {xml_path}: {e}")
+    root = tree.getroot()
+
+    if root.tag != "screen" or root.attrib.get("name") != "main":
+        raise LgsError("Invalid root element or screen name.")
+
+    bg_attr = root.attrib.get("bg")
+    if not bg_attr:
+        bg = os.path.join(theme_path, "main.png")
+    else:
+        # If the bg path is relative, prepend the theme path
+        bg = os.path.join(theme_path, bg_attr) if not os.path.isabs(bg_attr) else bg_attr
+
+    screen_data = {
+        "bg": bg,
+        "zones": []
+    }
+
+    for zone in root.findall("zone"):
+        try:
+            name = zone.attrib["name"]
+            image = zone.attrib["image"]
+            x1 = int(zone.attrib["x1"])
+            y1 = int(zone.attrib["y1"])
+            x2 = int(zone.attrib["x2"])
+            y2 = int(zone.attrib["y2"])
+            target = zone.attrib["target"]
+
+            screen_data["zones"].append(Zone(
+                name, layout.scale_box((x1, y1, x2, y2)), f"{theme_path}{image}", Action(NAVIGATE, target)
+            ))
+
+        except KeyError as e:
+            raise LgsError(f"Missing attribute in zone: {e}")
+        except ValueError as e:
+            raise LgsError(f"Invalid coordinate in zone: {e}")
+
+    return screen_data
+
+def parse_inscoperoms_xml(xml_path):
+    with PROFILER.timer("startup.parse_inscoperoms"):
+        return _parse_inscoperoms_xml(xml_path)
+
+def _parse_inscoperoms_xml(xml_path):
+    if not os.path.exists(xml_path):
+        raise LgsError(f"XML file not found: {xml_path}")
+
+    try:
+        tree = ET.parse(xml_path)
+    except ET.ParseError as e:
+        raise LgsError(f"Failed to parse XML file: {e}")
+
+    root = tree.getroot()
+    inscoperoms = {}
+
+    for system in root.findall("system"):
+        try:
+            name = system.attrib["name"]
+            gamelist = system.find("gamelist").text
+            #rompath = system.find("rompath").text
+            lightgunroms = []
+
+            for rom in system.find("lightgunroms").findall("rom"):
+                rom_name = rom.attrib["name"]
+                rom_file = rom.attrib["file"]
+                lightgunroms.append(Rom(rom_name, rom_file))
+
+            inscoperoms[name] = System(gamelist, os.path.dirname(gamelist), lightgunroms)
+
+        except Exception as e:
+            raise LgsError(f"Malformed entry in XML for system '{system.attrib.get('name')}': {e}")
+
+    return inscoperoms
+
+class MediaIndex:
+    # Which media files exist, answered from memory. Each folder is listed
+    # once with os.scandir the first time one of its files is asked about,
+    # so a page of game art costs one directory read instead of a stat per
+    # image, which matters on NFS/SMB ROM shares. Stats for thumbnail stamps
+    # are kept with their folder's listing and expire with it after
+    # MAX_AGE_S, so art replaced on disk is picked up again by the next
+    # decode. forget() drops folders at once, e.g. after a library reload.
+    MAX_AGE_S = 60.0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # folder -> (listed at, names or None when unlistable, {name: stat})
+        self.folders = {}
+
+    def clear(self):
+        with self.lock:
+            self.folders = {}
+
+    def forget(self, folders):
+        with self.lock:
+            for folder in folders:
+                self.folders.pop(os.path.abspath(folder), None)
+
+    def _folder(self, folder):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.folders.get(folder)
+        if entry is not None and now - entry[0] < self.MAX_AGE_S:
+            return entry
+
+        try:
+            with PROFILER.timer("media.scan"), os.scandir(folder) as it:
+                names = frozenset(entry.name for entry in it)
+        except FileNotFoundError:
+            names = frozenset()
+        except OSError as e:
+            # Unreadable but maybe searchable, fall back to stat per file
+            print(f"[WARN] Cannot list {folder}: {e}")
+            names = None
+        entry = (now, names, {})
+        with self.lock:
+            self.folders[folder] = entry
+        return entry
+
+    def exists(self, path):
+        if not path:
+            return False
+        folder, name = os.path.split(os.path.abspath(path))
+        names = self._folder(folder)[1]
+        if names is None:
+            return os.path.exists(path)
+        return name in names
+
+    def stat(self, path):
+        # os.stat() of a listed file, raising FileNotFoundError without a
+        # syscall when its folder listing does not have it
+        folder, name = os.path.split(os.path.abspath(path))
+        _, names, stats = self._folder(folder)
+        st = stats.get(name)
+        if st is not None:
+            return st
+        if names is not None and name not in names:
+            raise FileNotFoundError(2, "No such file or directory", path)
+        st = os.stat(path)
+        stats[name] = st
+        return st
+
+def render_thumbnail(path, size, flatten):
+    img = Image.open(path).resize(size, Image.LANCZOS)
+
+    if flatten:
+        # Replace transparency with black if present
+        if img.mode in ("RGBA", "LA"):
+            black_bg = Image.new("RGB", img.size, (0, 0, 0))
+            black_bg.paste(img, mask=img.split()[-1])  # Use alpha channel as mask
+            img = black_bg
+        else:
+            img = img.convert("RGB")
+    elif img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    return img
+
+class ThumbnailCache:
+    # Resized button art stored on disk as "<source key>-<stamp>.<ext>".
+    # The source key covers the path, target size and flatten mode, the stamp
+    # covers the source mtime and size, so an edited image never hits a stale
+    # thumbnail. Flattened thumbnails are raw PPM, alpha ones fast PNG.
+    # Sources are stat'ed through a MediaIndex when one is given.
+    # A hit touches the file, so eviction drops the least recently used.
+    # Going over budget prunes down to PRUNE_TO of it, leaving room for a
+    # good number of new thumbnails before the folder is scanned again.
+    PRUNE_TO = 0.8
+
+    def __init__(self, cache_dir, max_mb, media=None):
+        self.cache_dir = cache_dir
+        self.stat = media.stat if media else os.stat
+        self.max_bytes = max_mb * 1024 * 1024
+        self.entries = {}
+        self.total_bytes = 0
+        # Prefetch workers load thumbnails concurrently with the Tk thread
+        self.lock = threading.Lock()
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.enabled = True
+        except OSError as e:
+            print(f"[WARN] Thumbnail cache disabled, cannot create {cache_dir}: {e}")
+            self.enabled = False
+
+        if self.enabled:
+            self.prune(self.max_bytes)
+
+    def prune(self, budget):
+        files = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith(".tmp"):
+                        self._remove(entry.name)
+                        continue
+                    src_key, sep, _ = entry.name.partition("-")
+                    if not sep:
+                        continue
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, src_key, entry.name))
+        except OSError as e:
+            print(f"[WARN] Failed to scan thumbnail cache: {e}")
+
+        # Most recently used first: keep one thumbnail per source while
+        # under budget
+        files.sort(reverse=True)
+        with self.lock:
+            self.entries = {}
+            self.total_bytes = 0
+            for mtime, size, src_key, name in files:
+                if src_key in self.entries or self.total_bytes + size > budget:
+                    self._remove(name)
+                    continue
+                self.entries[src_key] = name
+                self.total_bytes += size
+
+    def load(self, path, size, flatten):
+        if not self.enabled:
+            return render_thumbnail(path, size, flatten)
+
+        st = self.stat(path)
+        mode = "flat" if flatten else "alpha"
+        source = f"{os.path.abspath(path)}|{size[0]}x{size[1]}|{mode}"
+        return self.cached(
+            source,
+            f"{st.st_mtime_ns:x}_{st.st_size:x}",
+            "ppm" if flatten else "png",
+            partial(render_thumbnail, path, size, flatten)
+        )
+
+    def load_composite(self, source, paths, render):
+        # An RGB image built from several files, stamped with all of them
+        if not self.enabled:
+            return render()
+
+        stamp = hashlib.sha1()
+        for path in paths:
+            st = self.stat(path)
+            stamp.update(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8"))
+        return self.cached(source, stamp.hexdigest()[:16], "ppm", render)
+
+    def cached(self, source, stamp, ext, render):
+        src_key = hashlib.sha1(source.encode("utf-8")).hexdigest()[:20]
+        name = f"{src_key}-{stamp}.{ext}"
+
+        with self.lock:
+            cached = self.entries.get(src_key)
+        if cached == name:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                img = Image.open(path)
+                img.load()
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Dropping unreadable thumbnail {name}: {e}")
+            else:
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return img
+        if cached:
+            # Source changed since the thumbnail was baked
+            self._remove(cached)
+            with self.lock:
+                if self.entries.get(src_key) == cached:
+                    del self.entries[src_key]
+
+        img = render()
+        self._store(src_key, name, img)
+        return img
+
+    def _store(self, src_key, name, img):
+        final = os.path.join(self.cache_dir, name)
+        tmp = f"{final}.{threading.get_ident()}.tmp"
+        try:
+            if img.mode == "RGB":
+                img.save(tmp, format="PPM")
+            else:
+                img.save(tmp, format="PNG", compress_level=1)
+            os.replace(tmp, final)
+        except OSError as e:
+            print(f"[WARN] Failed to write thumbnail {name}: {e}")
+            self._remove(os.path.basename(tmp))
+            return
+
+        with self.lock:
+            self.entries[src_key] = name
+            self.total_bytes += os.path.getsize(final)
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.prune(int(self.max_bytes * self.PRUNE_TO))
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+def load_gamelist(gamelist_path, rompath, wanted=None):
+    # Streams <game> entries keeping only path, name and image; everything
+    # else (descriptions, ratings, videos) is discarded as it is parsed.
+    # With a set of wanted basenames, parsing stops once all were found.
+    rom_lookup = {}
+    by_basename = {}
+    missing = set(wanted) if wanted is not None else None
+    if missing is not None and not missing:
+        return rom_lookup, by_basename
+    depth = 0
+
+    context = ET.iterparse(gamelist_path, events=("start", "end"))
+    for event, elem in context:
+        if event == "start":
+            if depth == 0:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # Top-level child complete, like root.findall("game") only games count
+        if elem.tag == "game":
+            path = (elem.findtext("path") or "").strip()
+            name = (elem.findtext("name") or "").strip()
+            image = (elem.findtext("image") or "").strip()
+
+            if path:
+                if path.startswith("./"):
+                    rom_file = os.path.join(rompath, os.path.basename(path))
+                else:
+                    rom_file = path
+                if image.startswith("./"):
+                    image = image[2:]
+                full_image = (
+                    image if not image or os.path.isabs(image)
+                    else os.path.join(rompath, image)
+                )
+                rom_lookup[rom_file] = Rom(name, rom_file, full_image)
+                # First entry wins, as with the old linear scan
+                rom_basename = os.path.basename(rom_file)
+                by_basename.setdefault(rom_basename, rom_file)
+
+                if missing is not None:
+                    missing.discard(rom_basename)
+                    if not missing:
+                        break
+        root.clear()
+
+    return rom_lookup, by_basename
+
+# Only region/language tags and the good-dump flag are ignored. Tags like
+# (Light Phaser), (Rev 1), (Disc 2) or (Proto) tell releases apart and stay.
+ROM_TAG_RE = re.compile(r"\s*(?:\(([^)]*)\)|\[([^\]]*)\])")
+ROM_REGION_TAGS = {
+    "usa", "europe", "japan", "world", "asia", "australia", "brazil", "canada", "china",
+    "france", "germany", "italy", "korea", "netherlands", "spain", "sweden", "taiwan", "uk",
+    "u", "e", "j", "ue", "ju", "jue",
+    "en", "fr", "de", "es", "it", "nl", "pt", "sv", "no", "da", "fi", "ja",
+}
+ROM_DUMP_FLAGS = {"!"}
+
+def _strip_rom_tag(match):
+    parens, brackets = match.groups()
+    if parens is not None:
+        if all(part.strip().casefold() in ROM_REGION_TAGS for part in parens.split(",")):
+            return ""
+    elif brackets.strip() in ROM_DUMP_FLAGS:
+        return ""
+    return match.group(0)
+
+def normalize_rom_name(rom_file):
+    # "Area 51 (USA) (Rev 1) [!].ZIP" -> "area 51 (rev 1)"
+    stem = os.path.splitext(os.path.basename(rom_file))[0]
+    stem = ROM_TAG_RE.sub(_strip_rom_tag, stem)
+    return " ".join(stem.casefold().split())
+
+def match_lightgun_roms(lightgunroms, rom_lookup, by_basename, normalized=False):
+    # Exact basename matches first, then an optional normalized pass over the
+    # entries still missing. Both passes are dict lookups, never a rescan.
+    keys = [by_basename.get(os.path.basename(entry.rom.strip())) for entry in lightgunroms]
+
+    if normalized and None in keys:
+        claimed = set(key for key in keys if key)
+        by_normalized = {}
+        for key in rom_lookup:
+            if key not in claimed:
+                by_normalized.setdefault(normalize_rom_name(key), []).append(key)
+
+        for idx, entry in enumerate(lightgunroms):
+            if keys[idx] is None:
+                candidates = by_normalized.get(normalize_rom_name(entry.rom.strip()))
+                if candidates:
+                    keys[idx] = candidates.pop(0)
+
+    # Gamelist records are shared, not copied
+    return [rom_lookup[key] for key in keys if key]
+
+def load_system(system, data, normalized=False):
+    gamelist_path = data.gamelist
+    rompath = data.rompath
+    lightgunroms = data.lightgunroms
+    rom_lookup = {}
+    by_basename = {}
+
+    # Stream gamelist.xml, stopping once every lightgun ROM was seen
+    if os.path.exists(gamelist_path):
+        wanted = set(os.path.basename(entry.rom.strip()) for entry in lightgunroms)
+        try:
+            with PROFILER.timer("startup.gamelist_parse"):
+                rom_lookup, by_basename = load_gamelist(gamelist_path, rompath, wanted)
+        except Exception as e:
+            print(f"[ERROR] Failed to parse XML for {system}: {e}")
+    else:
+        print(f"[WARN] Missing gamelist.xml for system: {system}")
+
+    # Match lightgunroms against gamelist
+    with PROFILER.timer("startup.match"):
+        matched_roms = match_lightgun_roms(lightgunroms, rom_lookup, by_basename, normalized)
+
+    # Keep the system with filtered roms (could be empty)
+    return System(gamelist_path, rompath, matched_roms)
+
+def load_systems(systems, workers=1, pool="process", normalized=False):
+    # Systems are independent, so their gamelists load in parallel. Results
+    # are merged in inscoperoms.xml order whatever order they finish in.
+    if workers <= 1 or len(systems) <= 1:
+        return {system: load_system(system, data, normalized) for system, data in systems.items()}
+
+    if pool == "thread":
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                system: executor.submit(load_system, system, data, normalized)
+                for system, data in systems.items()
+            }
+            return {system: future.result() for system, future in futures.items()}
+
+    # XML parsing holds the GIL, processes use every core. Workers start
+    # with an empty profile and send their samples back with each result.
+    with ProcessPoolExecutor(max_workers=workers, initializer=_reset_profiler,
+                             initargs=(PROFILER.enabled,)) as executor:
+        futures = {
+            system: executor.submit(load_system_profiled, system, data, normalized)
+            for system, data in systems.items()
+        }
+        filtered_systems = {}
+        for system, future in futures.items():
+            filtered_systems[system], profile = future.result()
+            PROFILER.merge(profile)
+        return filtered_systems
+
+def _reset_profiler(enabled):
+    # Pool initializer by name: the bound PROFILER.reset would pickle the
+    # profiler and its lock under the spawn/forkserver start methods, which
+    # also start from a fresh module where profiling is off
+    PROFILER.reset()
+    PROFILER.enabled = enabled
+
+def load_system_profiled(system, data, normalized=False):
+    return load_system(system, data, normalized), PROFILER.drain()
+
+LIBRARY_CACHE_VERSION = 3
+
+def file_stamp(path, stat=os.stat):
+    try:
+        st = stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def read_library_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            cache = pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable library cache {cache_path}: {e}")
+        return {}
+
+    if not isinstance(cache, dict) or cache.get("version") != LIBRARY_CACHE_VERSION:
+        return {}
+    return cache
+
+def write_library_cache(cache_path, cache):
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print(f"[WARN] Failed to write library cache {cache_path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def load_library(inscope_path, cache_path, workers=1, pool="process", normalized=False):
+    with PROFILER.timer("startup.library"):
+        return _load_library(inscope_path, cache_path, workers, pool, normalized)
+
+def _load_library(inscope_path, cache_path, workers=1, pool="process", normalized=False):
+    # Matched systems are cached with the mtime/size of inscoperoms.xml and
+    # of every gamelist. Only systems whose gamelist or inscope entry changed
+    # are loaded again; when nothing changed no XML is parsed at all.
+    cache = read_library_cache(cache_path)
+    if cache.get("normalized") != normalized:
+        cache = {}
+
+    inscope_stamp = file_stamp(inscope_path)
+    if cache and cache.get("inscope_stamp") == inscope_stamp:
+        systems = cache["inscope"]
+    else:
+        systems = parse_inscoperoms_xml(inscope_path)
+
+    cached_systems = cache.get("systems", {})
+    entries = {}
+    stale = {}
+    for system, data in systems.items():
+        # Stamp before loading, a gamelist edited mid-load is reloaded next run
+        stamp = file_stamp(data.gamelist)
+        entry = cached_systems.get(system)
+        if entry and entry["source"] == data and entry["stamp"] == stamp:
+            entries[system] = entry
+        else:
+            stale[system] = data
+            entries[system] = {"source": data, "stamp": stamp}
+
+    if stale:
+        loaded = load_systems(stale, workers, pool, normalized)
+        for system, result in loaded.items():
+            entries[system]["result"] = result
+
+    if stale or cache.get("inscope_stamp") != inscope_stamp or len(cached_systems) != len(entries):
+        write_library_cache(cache_path, {
+            "version": LIBRARY_CACHE_VERSION,
+            "normalized": normalized,
+            "inscope_stamp": inscope_stamp,
+            "inscope": systems,
+            "systems": entries,
+        })
+
+    print(f"Library loaded: {len(systems) - len(stale)} systems from cache, {len(stale)} rebuilt.")
+    return {system: entry["result"] for system, entry in entries.items()}
+
+def library_changes(old, new):
+    # Systems added, removed or with a different matched ROM list
+    return {system for system in old.keys() | new.keys() if old.get(system) != new.get(system)}
+
+class FileWatcher:
+    # Collects changes to a set of files on a background thread. inotify
+    # watches their folders, as scrapers and editors often replace a file by
+    # renaming a new one over it; without inotify, or with poll=True, the
+    # files' mtime and size are polled. A change is reported once the file
+    # has been quiet for SETTLE_S, so a scrape in progress is read once.
+    # Folders that cannot be watched yet, e.g. a system folder created after
+    # startup, are retried every POLL_S and their files polled meanwhile.
+    SETTLE_S = 1.0
+    POLL_S = 2.0
+
+    # <sys/inotify.h>
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_DELETE = 0x200
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, paths, poll=False):
+        self.lock = threading.Lock()
+        self.paths = set()
+        self.pending = {}
+        self.stamps = {}
+        self.folders = {}
+        self.unwatched = set()
+        self.libc = None if poll else self._libc()
+        self.fd = -1
+        if self.libc:
+            self.fd = self.libc.inotify_init1(self.IN_CLOEXEC)
+            if self.fd < 0:
+                print(f"[WARN] inotify unavailable, polling library files: {os.strerror(ctypes.get_errno())}")
+        self.set_paths(paths)
+        threading.Thread(target=self._watch if self.fd >= 0 else self._poll, daemon=True).start()
+
+    def _libc(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        except OSError:
+            return None
+        return libc if hasattr(libc, "inotify_init1") else None
+
+    def set_paths(self, paths):
+        paths = set(os.path.abspath(path) for path in paths if path)
+        with self.lock:
+            self.paths = paths
+            for path in paths:
+                self.stamps.setdefault(path, file_stamp(path))
+        if self.fd >= 0:
+            self._add_watches()
+
+    def _add_watches(self):
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+        with self.lock:
+            unwatched = set()
+            for folder in set(os.path.dirname(path) for path in self.paths) - set(self.folders.values()):
+                wd = self.libc.inotify_add_watch(self.fd, folder.encode(), mask)
+                if wd < 0:
+                    err = ctypes.get_errno()
+                    if err != errno.ENOENT and folder not in self.unwatched:
+                        print(f"[WARN] Cannot watch {folder}, polling it: {os.strerror(err)}")
+                    unwatched.add(folder)
+                    continue
+                self.folders[wd] = folder
+            self.unwatched = unwatched
+
+    def changed(self):
+        # Settled changes since the last call
+        now = time.monotonic()
+        with self.lock:
+            ready = set(path for path, at in self.pending.items() if now - at >= self.SETTLE_S)
+            for path in ready:
+                del self.pending[path]
+        return ready
+
+    def _mark(self, path):
+        with self.lock:
+            if path in self.paths:
+                self.pending[path] = time.monotonic()
+
+    def _watch(self):
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], self.POLL_S)
+            if ready:
+                data = os.read(self.fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    wd, _, _, length = self.EVENT.unpack_from(data, offset)
+                    offset += self.EVENT.size
+                    name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                    offset += length
+                    folder = self.folders.get(wd)
+                    if folder and name:
+                        self._mark(os.path.join(folder, name))
+
+            if self.unwatched:
+                # Polled before the watch is added, so a file created along
+                # with its folder is not missed
+                with self.lock:
+                    paths = [path for path in self.paths if os.path.dirname(path) in self.unwatched]
+                self._check(paths)
+                self._add_watches()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.POLL_S)
+            with self.lock:
+                paths = list(self.paths)
+            self._check(paths)
+
+    def _check(self, paths):
+        for path in paths:
+            stamp = file_stamp(path)
+            if stamp != self.stamps.get(path):
+                self.stamps[path] = stamp
+                self._mark(path)
+
+class HitIndex:
+    # Uniform grid over the canvas, each cell lists the zones overlapping it
+    # in screen order, so a pointer lookup checks one or two zones at most
+    CELL = 40
+
+    def __init__(self, zones, width=DESIGN_SIZE[0], height=DESIGN_SIZE[1]):
+        self.cols = width // self.CELL + 1
+        self.rows = height // self.CELL + 1
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+
+        for zone in zones:
+            x1, y1, x2, y2 = zone.xy
+            for row in range(max(0, y1 // self.CELL), min(self.rows - 1, y2 // self.CELL) + 1):
+                for col in range(max(0, x1 // self.CELL), min(self.cols - 1, x2 // self.CELL) + 1):
+                    self.cells[row * self.cols + col].append(zone)
+
+    def zone_at(self, x, y):
+        col = x // self.CELL
+        row = y // self.CELL
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None
+
+        for zone in self.cells[row * self.cols + col]:
+            x1, y1, x2, y2 = zone.xy
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                return zone
+        return None
+
+def truncate_label(text, width):
+    text = text.strip()
+    if len(text) > width:
+        text = text[:width-3] + "..."
+    return text or None
+
+class LazyScreens(Mapping):
+    # Screens by name. System pages "{system}_{n}" are built from the matched
+    # ROM list the first time they are looked up and memoized; the least
+    # recently used pages are dropped past max_pages. Prefetch threads look
+    # pages up too, hence the lock. Pages are built outside it: looking up
+    # game art may list a folder on a network share, and the Tk thread
+    # looks up the current page on every pointer move.
+    def __init__(self, static, rom_counts, games_per_page, build_page, max_pages=64):
+        self.static = static
+        self.games_per_page = games_per_page
+        self.page_counts = {system: ceil(count / games_per_page) for system, count in rom_counts.items()}
+        self.build_page = build_page
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by reload(), pages built from an older library are not kept
+        self.generation = 0
+
+    def _page(self, name):
+        system, sep, page = name.rpartition("_")
+        if not sep or not page.isdigit():
+            return None
+        page = int(page)
+        if not 1 <= page <= self.page_counts.get(system, 0):
+            return None
+        return system, page - 1
+
+    def __contains__(self, name):
+        return name in self.static or self._page(name) is not None
+
+    def reload(self, rom_counts, systems, update=None):
+        # New page counts after a library change. update() runs under the
+        # lock first, e.g. to swap library entries, then the memoized pages
+        # of the given systems are dropped so they get rebuilt.
+        with self.lock:
+            if update:
+                update()
+            self.generation += 1
+            self.page_counts = {system: ceil(count / self.games_per_page) for system, count in rom_counts.items()}
+            for name in [name for name in self.pages if name.rpartition("_")[0] in systems]:
+                del self.pages[name]
+
+    def __getitem__(self, name):
+        if name in self.static:
+            return self.static[name]
+
+        page = self._page(name)
+        if page is None:
+            raise KeyError(name)
+
+        with self.lock:
+            screen = self.pages.get(name)
+            if screen is not None:
+                self.pages.move_to_end(name)
+                return screen
+            generation = self.generation
+
+        with PROFILER.timer("screen.build_page"):
+            screen = self.build_page(*page)
+
+        with self.lock:
+            if generation != self.generation:
+                return screen
+            # Built by two threads at once, the first one stays
+            screen = self.pages.setdefault(name, screen)
+            self.pages.move_to_end(name)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+            return screen
+
+    def __iter__(self):
+        yield from self.static
+        for system, count in self.page_counts.items():
+            for page in range(count):
+                yield f"{system}_{page + 1}"
+
+    def __len__(self):
+        return len(self.static) + sum(self.page_counts.values())
+
+def build_page(library, layout, theme_path, system_name, page, media=None):
+    # Zones of one system page. Game art that is not on disk is replaced by
+    # game_default.png here, once.
+    GAMES_PER_PAGE = layout.games_per_page
+    lightgunroms = library[system_name].lightgunroms
+    total_pages = ceil(len(lightgunroms) / GAMES_PER_PAGE)
+
+    zones = []
+    first = page * GAMES_PER_PAGE
+    page_items = lightgunroms[first:first + GAMES_PER_PAGE]
+    # Shared by every game zone
+    default_image = f"{theme_path}game_default.png"
+    overlay = f"{theme_path}game.png"
+
+    for idx, item in enumerate(page_items):
+        image = item.image
+        if media and not media.exists(image):
+            if image:
+                print(f"[WARN] Image not found for {system_name} game '{item.name}' at path: {image}")
+            image = None
+        zones.append(Zone(
+            first + idx + 1,
+            layout.button_boxes[idx],
+            image or default_image,
+            Action(LAUNCH, system_name, item.rom),
+            overlay,
+            # Hover text, extracted and truncated once
+            truncate_label(item.name, layout.game_name_width),
+        ))
+
+    if page > 0:
+        zones.append(Zone("prev", layout.prev_xy, f"{theme_path}button_prev.png",
+                          Action(NAVIGATE, f"{system_name}_{page}")))
+
+    zones.append(Zone("main", layout.main_xy, f"{theme_path}button_main.png", Action(NAVIGATE, "main")))
+
+    if page < total_pages - 1:
+        zones.append(Zone("next", layout.next_xy, f"{theme_path}button_next.png",
+                          Action(NAVIGATE, f"{system_name}_{page + 2}")))
+
+    return {
+        "bg": f"{theme_path}{system_name}.png",
+        "zones": zones
+    }
+
+class PageImages:
+    # Every image a screen draws as {cache key: loader}. Loaders only do PIL
+    # work so prefetch threads and build-index can run them too. Theme
+    # images, backgrounds included, come pre-scaled to the screen from the
+    # assets cache, game art from the thumbnail cache, baked pages from a
+    # cache of their own. Whether a file exists is looked up in the media
+    # index, never stat'ed per render.
+    def __init__(self, screens, thumbs, layout, theme_path, baked=False, assets=None, media=None, pages=None):
+        self.screens = screens
+        self.thumbs = thumbs
+        self.assets = assets or thumbs
+        self.pages = pages or self.assets
+        self.layout = layout
+        self.theme_path = theme_path
+        self.baked = baked
+        self.media = media or MediaIndex()
+
+    def cache_for(self, path):
+        return self.assets if path.startswith(self.theme_path) else self.thumbs
+
+    def theme_image(self, path):
+        # Crosshairs, dents and the like at their design size scaled to the screen
+        with Image.open(path) as img:
+            size = img.size
+        return self.assets.load(path, self.layout.scale_size(size), False)
+
+    def screen_images(self, name):
+        if self.baked and name != "main" and name in self.screens:
+            return {("page", name): partial(self.bake_screen, name)}
+        return self.layer_images(name)
+
+    def source_stamps(self, loader):
+        # (path, stamp) of the files a loader reads, a baked page reads its layers
+        if loader.func == self.bake_screen:
+            paths = [layer.args[0] for layer in self.layer_images(loader.args[0], warn=False).values()]
+        else:
+            paths = [loader.args[0]]
+        return tuple((path, file_stamp(path, self.media.stat)) for path in paths)
+
+    def layer_images(self, name, warn=True):
+        # Every loader takes its source path as first argument
+        screen = self.screens.get(name, {})
+        images = {}
+
+        bg_path = screen.get("bg")
+        if bg_path:
+            images[("bg", bg_path)] = partial(self.cache_for(bg_path).load, bg_path, self.layout.screen_size, True)
+
+        for zone in screen.get("zones", []):
+            x1, y1, x2, y2 = zone.xy
+            image_path = zone.image
+
+            if not self.media.exists(image_path):
+                if warn:
+                    print(f"[WARN] Image not found for zone '{zone.name}' at path: {image_path}")
+                image_path = f"{self.theme_path}game_default.png"
+
+            is_nav_button = zone.name in ["main", "prev", "next"]
+
+            if not is_nav_button and zone.overlay:
+                images[(name, zone.name, "base")] = partial(self.cache_for(image_path).load, image_path, self.layout.base_size, True)
+
+                overlay_path = zone.overlay
+                if self.media.exists(overlay_path):
+                    # The overlay is identical on every button, share one photo
+                    images[("overlay", overlay_path)] = partial(
+                        self.cache_for(overlay_path).load, overlay_path,
+                        (self.layout.button_width, self.layout.button_height), False)
+            else:
+                images[(name, zone.name, "button")] = partial(
+                    self.cache_for(image_path).load, image_path, (x2 - x1, y2 - y1), False)
+
+        return images
+
+    def bake_screen(self, name):
+        # Background, game art, overlays and nav buttons composited into one
+        # image, kept on disk keyed by the page contents and theme
+        screen = self.screens[name]
+        layers = self.layer_images(name)
+        offset = self.layout.button_frame_offset
+
+        def render():
+            page = layers[("bg", screen["bg"])]().convert("RGB")
+            for zone in screen["zones"]:
+                x1, y1, _, _ = zone.xy
+                base_key = (name, zone.name, "base")
+                try:
+                    if base_key in layers:
+                        page.paste(layers[base_key](), (x1 + offset, y1 + offset))
+                        overlay_key = ("overlay", zone.overlay)
+                        if overlay_key in layers:
+                            overlay = layers[overlay_key]()
+                            page.paste(overlay, (x1, y1), overlay)
+                    else:
+                        button = layers[(name, zone.name, "button")]()
+                        page.paste(button, (x1, y1), button)
+                except Exception as e:
+                    print(f"[ERROR] Failed to bake zone '{zone.name}': {e}")
+            return page
+
+        source = "|".join(["page", os.path.abspath(self.theme_path), name] + [
+            repr((key, loader.args)) for key, loader in layers.items()
+        ])
+        return self.pages.load_composite(source, [loader.args[0] for loader in layers.values()], render)
+
+def asset_cache(settings, screen_size, media=None):
+    # One folder per resolution, switching screens keeps both sets
+    width, height = screen_size
+    return ThumbnailCache(os.path.join(settings.asset_cache_dir, f"{width}x{height}"), settings.asset_cache_mb, media)
+
+def page_cache(settings, screen_size, media=None):
+    # Baked pages in a subfolder of the resolution's assets, only when used
+    if not settings.baked_pages:
+        return None
+    width, height = screen_size
+    return ThumbnailCache(os.path.join(settings.asset_cache_dir, f"{width}x{height}", "pages"),
+                          settings.page_cache_mb, media)
+
+def build_index(settings, layout, inscope_path="inscoperoms.xml", pages=0):
+    # Matches the library into its cache and scales the theme images to
+    # layout.screen_size ahead of the menu. With pages, the thumbnails (or
+    # baked pages) of the first pages of every system are rendered too.
+    library = load_library(inscope_path, settings.library_cache, settings.loader_workers,
+                           settings.loader_pool, settings.normalized_rom_match)
+
+    theme_path = settings.theme_path
+    media = MediaIndex()
+    # The same screens the front end shows, their actions are never run here
+    screens = LazyScreens(
+        {"main": load_main_screen(f"{theme_path}main.xml", theme_path, layout)},
+        {system: len(data.lightgunroms) for system, data in library.items()},
+        layout.games_per_page,
+        partial(build_page, library, layout, theme_path, media=media)
+    )
+    images = PageImages(screens, ThumbnailCache(settings.thumb_cache_dir, settings.thumb_cache_mb, media),
+                        layout, theme_path, settings.baked_pages, asset_cache(settings, layout.screen_size, media), media,
+                        page_cache(settings, layout.screen_size, media))
+
+    def prepare(key, loader):
+        try:
+            loader()
+        except Exception as e:
+            print(f"[WARN] Failed to prepare {key}: {e}")
+
+    # Backgrounds, buttons and overlays of every screen, no game art
+    for name in ["main"] + [f"{system}_1" for system in library if f"{system}_1" in screens]:
+        for key, loader in images.layer_images(name).items():
+            if loader.args[0].startswith(theme_path):
+                prepare(key, loader)
+    for name in sorted(os.listdir(theme_path)):
+        if name.startswith(("target", "dent_")) and name.endswith(".png"):
+            prepare(name, partial(images.theme_image, os.path.join(theme_path, name)))
+    width, height = layout.screen_size
+    print(f"Theme images prepared for {width}x{height}.")
+
+    if pages > 0:
+        names = [name for name in screens if name != "main" and int(name.rpartition("_")[2]) <= pages]
+        for name in names:
+            for key, loader in images.screen_images(name).items():
+                prepare(key, loader)
+        print(f"Prepared images for {len(names)} pages.")
+    return library
@@ -0,0 +1,249 @@
+import glob
+import json
+import os
+import queue
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# Optional: python3-evdev reads guns straight from /dev/input, without it
+# LGS stays on Tk mouse events. Replayed streams need no evdev at all.
+try:
+    import evdev
+except ImportError:
+    evdev = None
+
+# Event types and codes from linux/input-event-codes.h, so replays and the
+# mapping below work without evdev installed
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0
+ABS_X = 0x00
+ABS_Y = 0x01
+BTN_LEFT = 0x110
+BTN_TRIGGER = 0x120
+TRIGGER_CODES = (BTN_LEFT, BTN_TRIGGER)
+
+# Reader output, consumed on the Tk thread
+MOVE = "move"
+FIRE = "fire"
+
+class GunDevice:
+    # Raw events of one gun to canvas positions. Axes are mapped from their
+    # ABS range to the canvas; a report (SYN) emits the latest position and
+    # then any trigger pulls that came with it, so a shot lands where the
+    # gun pointed in the same report.
+    def __init__(self, gun, abs_x, abs_y, width, height, emit):
+        self.gun = gun
+        self.abs_x = abs_x
+        self.abs_y = abs_y
+        self.width = width
+        self.height = height
+        self.emit = emit
+        self.raw = [(abs_x[0] + abs_x[1]) // 2, (abs_y[0] + abs_y[1]) // 2]
+        self.moved = False
+        self.pulls = 0
+
+    def scale(self, value, axis_range, size):
+        low, high = axis_range
+        if high <= low:
+            return 0
+        value = min(max(value, low), high)
+        return (value - low) * (size - 1) // (high - low)
+
+    def position(self):
+        return (self.scale(self.raw[0], self.abs_x, self.width),
+                self.scale(self.raw[1], self.abs_y, self.height))
+
+    def feed(self, type_, code, value):
+        if type_ == EV_ABS and code in (ABS_X, ABS_Y):
+            self.raw[code] = value
+            self.moved = True
+        elif type_ == EV_KEY and code in TRIGGER_CODES and value == 1:
+            self.pulls += 1
+        elif type_ == EV_SYN and code == SYN_REPORT:
+            x, y = self.position()
+            if self.moved:
+                self.emit((MOVE, self.gun, x, y, time.perf_counter()))
+                self.moved = False
+            for _ in range(self.pulls):
+                self.emit((FIRE, self.gun, x, y, time.perf_counter()))
+            self.pulls = 0
+
+def is_gun(device):
+    caps = device.capabilities()
+    axes = [code if isinstance(code, int) else code[0] for code in caps.get(EV_ABS, [])]
+    keys = caps.get(EV_KEY, [])
+    return ABS_X in axes and ABS_Y in axes and any(code in keys for code in TRIGGER_CODES)
+
+def open_guns(paths):
+    # Configured device paths in order, or every absolute pointer with a
+    # trigger sorted by path. by-id paths keep player numbers stable.
+    if evdev is None:
+        raise RuntimeError("python3-evdev is not installed")
+
+    if paths:
+        return [evdev.InputDevice(path) for path in paths]
+
+    guns = []
+    for path in sorted(glob.glob("/dev/input/event*")):
+        try:
+            device = evdev.InputDevice(path)
+        except OSError:
+            continue
+        if is_gun(device):
+            guns.append(device)
+        else:
+            device.close()
+    return guns
+
+def abs_range(device, code):
+    info = device.absinfo(code)
+    return (info.min, info.max)
+
+def read_replay(path):
+    # JSON lines: {"gun": n, "x": [min, max], "y": [min, max]} describes a
+    # gun, [seconds, gun, type, code, value] is one event
+    ranges = {}
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                ranges[item["gun"]] = (tuple(item["x"]), tuple(item["y"]))
+            else:
+                events.append(tuple(item))
+    return ranges, events
+
+class GunReader(ABC):
+    # Guns read on a background thread, queued as MOVE/FIRE tuples
+    # (kind, gun, x, y, perf_counter) in canvas coordinates for the Tk
+    # thread. While paused, events are dropped. Subclasses provide the
+    # read loop.
+    def __init__(self):
+        self.events = queue.Queue()
+        self.paused = False
+        self.guns = {}
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def emit(self, event):
+        if not self.paused:
+            self.events.put(event)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    @abstractmethod
+    def _read(self):
+        pass
+
+class DeviceReader(GunReader):
+    # evdev devices, grabbed so X does not also see the guns as mice. While
+    # paused they are released, e.g. to the emulator.
+    def __init__(self, devices, width, height, grab=True):
+        self.devices = devices
+        self.grab = grab
+        super().__init__()
+        for gun, device in enumerate(devices):
+            self.guns[device.fd] = GunDevice(
+                gun, abs_range(device, ABS_X), abs_range(device, ABS_Y), width, height, self.emit)
+        self.set_grab(grab)
+        self.start()
+
+    def set_grab(self, grab):
+        for device in self.devices:
+            try:
+                if grab:
+                    device.grab()
+                else:
+                    device.ungrab()
+            except OSError as e:
+                print(f"[WARN] Failed to {'grab' if grab else 'release'} {device.path}: {e}")
+
+    def pause(self):
+        super().pause()
+        if self.grab:
+            self.set_grab(False)
+
+    def resume(self):
+        if self.grab:
+            self.set_grab(True)
+        super().resume()
+
+    def _read(self):
+        by_fd = {device.fd: device for device in self.devices}
+        while by_fd:
+            ready, _, _ = select.select(list(by_fd), [], [])
+            for fd in ready:
+                gun = self.guns[fd]
+                try:
+                    for event in by_fd[fd].read():
+                        gun.feed(event.type, event.code, event.value)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    print(f"[WARN] Gun {gun.gun + 1} disconnected: {e}")
+                    del by_fd[fd]
+
+class ReplayReader(GunReader):
+    # A recorded stream played back in real time in place of devices, for
+    # testing without hardware
+    def __init__(self, path, width, height, loop=False):
+        ranges, self.replay = read_replay(path)
+        self.loop = loop
+        super().__init__()
+        for gun, (abs_x, abs_y) in ranges.items():
+            self.guns[gun] = GunDevice(gun, abs_x, abs_y, width, height, self.emit)
+        self.start()
+
+    def _read(self):
+        while True:
+            started = time.monotonic()
+            for at, gun, type_, code, value in self.replay:
+                delay = started + at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if gun in self.guns:
+                    self.guns[gun].feed(type_, code, value)
+            if not self.loop:
+                return
+
+def record_input(devices, path, seconds=None):
+    # Writes the raw stream of the given devices in read_replay() format
+    started = time.monotonic()
+    by_fd = {device.fd: (gun, device) for gun, device in enumerate(devices)}
+    with open(path, "w") as f:
+        for gun, device in by_fd.values():
+            x_range = abs_range(device, ABS_X)
+            y_range = abs_range(device, ABS_Y)
+            f.write(json.dumps({"gun": gun, "x": list(x_range), "y": list(y_range), "device": device.path}) + "\n")
+
+        while seconds is None or time.monotonic() - started < seconds:
+            ready, _, _ = select.select(list(by_fd), [], [], 0.5)
+            for fd in ready:
+                gun, device = by_fd[fd]
+                for event in device.read():
+                    if event.type in (EV_SYN, EV_KEY, EV_ABS):
+                        f.write(json.dumps([round(time.monotonic() - started, 4), gun,
+                                            event.type, event.code, event.value]) + "\n")
+
+def crosshair_path(theme_path, gun, configured=None):
+    # Player 1 keeps target.png, others use target_p2.png etc. when the
+    # theme has them
+    if configured:
+        return configured if os.path.isabs(configured) else os.path.join(theme_path, configured)
+    if gun > 0:
+        path = os.path.join(theme_path, f"target_p{gun + 1}.png")
+        if os.path.isfile(path):
+            return path
+    return os.path.join(theme_path, "target.png")